@@ -0,0 +1,138 @@
+"""Асинхронные версии переключателей избранного, корзины и подписки.
+
+Подключаются вместо действий вьюсетов при ASYNC_TOGGLES и работают под
+ASGI-сервером: токен проверяется CachedTokenAuthentication в потоке,
+поиск объектов идёт через асинхронный ORM, а запись выполняется теми же
+транзакционными функциями из api.toggles, что и в синхронных вьюсетах. Ответы и ошибки совпадают с
+ответами DRF. Замеры и метрики подписываются именами действий
+вьюсетов, например RecipeViewSet.favorite.
+
+Выигрыша в параллельности нет: без асинхронного драйвера базы (Django 4.1)
+все обращения к ней идут через sync_to_async в одном потоке воркера.
+Результаты load_test --compare приведены в README.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from recipes.models import Favorite, Recipe, ShoppingCart
+from rest_framework import exceptions, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from users.models import User
+
+from .authentication import CachedTokenAuthentication
+from .serializers import FavoriteSerializer
+from .toggles import (add_recipe_to, remove_recipe_from, subscribe,
+                      unsubscribe)
+
+ALLOWED_METHODS = ("POST", "DELETE")
+
+
+async def authenticate(request):
+    """Проверяет токен тем же CachedTokenAuthentication, что и вьюсеты."""
+    result = await sync_to_async(
+        CachedTokenAuthentication().authenticate
+    )(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+def render(data=None, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(status=status_code, headers=headers)
+    if data is None:
+        del response["Content-Type"]
+    else:
+        response["Content-Type"] = "application/json"
+        response.content = JSONRenderer().render(data)
+    response["Allow"] = ", ".join((*ALLOWED_METHODS, "OPTIONS"))
+    response["Vary"] = "Accept"
+    return response
+
+
+def error_response(exc):
+    headers = {}
+    if isinstance(
+        exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+    ):
+        exc.status_code = status.HTTP_401_UNAUTHORIZED
+        headers["WWW-Authenticate"] = TokenAuthentication.keyword
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    return render(data, exc.status_code, headers)
+
+
+def api_view(name):
+    """Аутентификация, проверка метода и обработка ошибок как в APIView;
+    name — имя действия вьюсета, которое заменяет представление."""
+    return lambda handler: make_view(handler, name)
+
+
+def make_view(handler, name):
+    @wraps(handler)
+    async def view(request, *args, **kwargs):
+        try:
+            request.user = await authenticate(request)
+            if request.method not in ALLOWED_METHODS:
+                raise exceptions.MethodNotAllowed(request.method)
+            data, status_code = await handler(request, *args, **kwargs)
+        except Http404:
+            return error_response(exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return error_response(exc)
+        return render(data, status_code)
+
+    # django.views.decorators.csrf.csrf_exempt в Django 4.1 превращает
+    # корутину в обычную функцию, поэтому флаг ставится вручную.
+    view.csrf_exempt = True
+    view.view_name = name
+    return view
+
+
+async def get_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+async def toggle_recipe(model, request, pk):
+    if request.method == "POST":
+        recipe = await get_or_404(Recipe.objects, id=pk)
+        await sync_to_async(add_recipe_to)(model, request.user, recipe)
+        return FavoriteSerializer(recipe).data, status.HTTP_201_CREATED
+    await sync_to_async(remove_recipe_from)(model, request.user, pk)
+    return None, status.HTTP_204_NO_CONTENT
+
+
+@api_view("RecipeViewSet.favorite")
+async def favorite(request, pk):
+    return await toggle_recipe(Favorite, request, pk)
+
+
+@api_view("RecipeViewSet.shopping_cart")
+async def shopping_cart(request, pk):
+    return await toggle_recipe(ShoppingCart, request, pk)
+
+
+@api_view("CustomUserViewSet.subscribe")
+async def subscribe_user(request, id):
+    author = await get_or_404(User.objects, pk=id)
+    if request.method == "POST":
+        drf_request = Request(
+            request,
+            parsers=[
+                parser() for parser in api_settings.DEFAULT_PARSER_CLASSES
+            ],
+            parser_context={"kwargs": {"id": id}},
+        )
+        drf_request.user = request.user
+        data = await sync_to_async(subscribe)(drf_request, author)
+        return data, status.HTTP_201_CREATED
+    await sync_to_async(unsubscribe)(request.user, author)
+    return None, status.HTTP_204_NO_CONTENT
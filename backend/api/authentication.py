@@ -0,0 +1,118 @@
+"""Аутентификация по токену без обращения к базе на каждый запрос.
+
+Пользователь по токену хранится в общем кеше под хешем токена и в
+ограниченном LRU-кеше процесса. Запись в процессе считается свежей
+TOKEN_CACHE_CHECK_INTERVAL секунд, затем берётся из общего кеша заново.
+Удаление токена (выход через token/logout, удаление пользователя) и
+сохранение пользователя (смена пароля, отключение) удаляют записи из
+общего кеша и кеша текущего процесса; остальные процессы перестают
+пускать по старой записи не позже чем через TOKEN_CACHE_CHECK_INTERVAL
+секунд. Если кеш по умолчанию хранится в памяти процесса, удаление до
+других воркеров не доходит, поэтому записи в нём тоже живут не дольше
+TOKEN_CACHE_CHECK_INTERVAL секунд. Изменения через QuerySet.update()
+сигналов не отправляют и кеш не сбрасывают.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import cache_is_shared
+
+
+class TokenCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    @staticmethod
+    def cache_key(key):
+        return "auth_token:" + hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+        return copy.copy(user)
+
+    def _set_local(self, key, user):
+        expires_at = time.monotonic() + settings.TOKEN_CACHE_CHECK_INTERVAL
+        with self._lock:
+            self._local[key] = user, expires_at
+            self._local.move_to_end(key)
+            while len(self._local) > settings.TOKEN_CACHE_MAX_SIZE:
+                self._local.popitem(last=False)
+
+    def get(self, key):
+        user = self._get_local(key)
+        if user is None:
+            user = cache.get(self.cache_key(key))
+            if user is not None:
+                self._set_local(key, user)
+        return user
+
+    @staticmethod
+    def timeout():
+        if cache_is_shared():
+            return settings.TOKEN_CACHE_TIMEOUT
+        return min(
+            settings.TOKEN_CACHE_TIMEOUT, settings.TOKEN_CACHE_CHECK_INTERVAL
+        )
+
+    def set(self, key, user):
+        cache.set(self.cache_key(key), user, self.timeout())
+        self._set_local(key, user)
+
+    def delete(self, keys):
+        """Удаляет токены сейчас и ещё раз после коммита, чтобы запрос,
+        прочитавший старые данные до коммита, не вернул их в кеш."""
+        keys = list(keys)
+        if not keys:
+            return
+
+        def delete():
+            with self._lock:
+                for key in keys:
+                    self._local.pop(key, None)
+            cache.delete_many([self.cache_key(key) for key in keys])
+
+        delete()
+        transaction.on_commit(delete)
+
+
+token_cache = TokenCache()
+
+
+def token_for(user, key):
+    token = Token(key=key, user_id=user.pk)
+    token.user = user
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который берёт пользователя из token_cache.
+
+    Неверные токены и отключённые пользователи не кешируются, поэтому
+    ошибки совпадают с ошибками TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, token_for(user, key)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
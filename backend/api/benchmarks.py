@@ -0,0 +1,104 @@
+import time
+from contextlib import contextmanager
+from itertools import accumulate
+
+from django.db import connection, transaction
+
+from recipes.models import IngredientAmount, Recipe
+
+
+@contextmanager
+def rolled_back():
+    """Выполняет блок в транзакции, которая затем откатывается, чтобы
+    тестовые данные не оставались в базе."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def with_on_commit(func):
+    """func, после которой сразу выполняются поставленные ею функции
+    transaction.on_commit. Внутри rolled_back() коммита нет, и без этого
+    замер не включал бы работу после коммита: сброс кешей, индексы,
+    варианты картинок."""
+
+    def call():
+        start = len(connection.run_on_commit)
+        result = func()
+        while len(connection.run_on_commit) > start:
+            callbacks = connection.run_on_commit[start:]
+            del connection.run_on_commit[start:]
+            for _, callback, *_ in callbacks:
+                callback()
+        return result
+
+    return call
+
+
+def weighted_sample(rng, population, cum_weights, k):
+    """k разных элементов с вероятностями по накопленным весам."""
+    chosen = set()
+    while len(chosen) < k:
+        chosen.update(rng.choices(population, cum_weights=cum_weights, k=k))
+    return list(chosen)[:k]
+
+
+def zipf_weights(count, exponent=1.0):
+    """Накопленные веса рангов 1..count по закону Ципфа."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[index]
+
+
+def measure(func, repeat):
+    """Время выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50": percentile(timings, 50),
+        "p95": percentile(timings, 95),
+        "mean": sum(timings) / len(timings),
+    }
+
+
+def create_recipes(author, count, batch_size, tags=None, ingredients=None):
+    """Создаёт count рецептов пачками через bulk_create.
+
+    tags и ingredients — функции без аргументов, которые возвращают id
+    тегов и id ингредиентов для очередного рецепта.
+    """
+    Through = Recipe.tags.through
+    for start in range(0, count, batch_size):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f"Рецепт {number}",
+                text="Описание",
+                image="recipes/bench.png",
+                cooking_time=30,
+            )
+            for number in range(start, min(start + batch_size, count))
+        )
+        if tags is not None:
+            Through.objects.bulk_create(
+                Through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in tags()
+            )
+        if ingredients is not None:
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe_id=recipe.pk, ingredient_id=ingredient_id, amount=1
+                )
+                for recipe in recipes
+                for ingredient_id in ingredients()
+            )
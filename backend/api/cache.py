@@ -0,0 +1,154 @@
+import hashlib
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+
+from recipes.models import Ingredient, Tag
+
+
+def cache_is_shared():
+    """Видят ли все процессы одни и те же записи кеша по умолчанию."""
+    return not isinstance(caches["default"], LocMemCache)
+
+
+def cache_timeout(timeout):
+    """Срок хранения записи, которую сбрасывают при изменениях данных.
+
+    Если у каждого процесса свой кеш, сброс из другого процесса до записи
+    не дойдёт, поэтому она живёт не дольше LOCAL_CACHE_MAX_TIMEOUT.
+    """
+    if cache_is_shared():
+        return timeout
+    return min(timeout, settings.LOCAL_CACHE_MAX_TIMEOUT)
+
+
+def version_key(model):
+    return f"model_version:{model._meta.label_lower}"
+
+
+def model_version(model):
+    """Версия данных модели в общем кеше: меняется при каждом изменении
+    записей и входит в ключи всего, что из них построено."""
+    version = cache.get(version_key(model))
+    if version is None:
+        cache.add(version_key(model), uuid4().hex, None)
+        version = cache.get(version_key(model))
+    return version
+
+
+def bump_model_version(model):
+    """Меняет версию сейчас и, внутри транзакции, ещё раз после коммита:
+    иначе запрос, прочитавший данные до коммита, сохранил бы их под новой
+    версией. Возвращает версию, установленную сейчас."""
+
+    def bump():
+        version = uuid4().hex
+        cache.set(version_key(model), version, None)
+        return version
+
+    version = bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+    return version
+
+
+def recipe_cache_keys(recipe_ids):
+    """Ключи общей для всех пользователей части представления рецептов.
+
+    В ключ входят версии тегов и ингредиентов, поэтому их изменение
+    сбрасывает все рецепты сразу.
+    """
+    prefix = f"recipe:{model_version(Tag)}:{model_version(Ingredient)}"
+    return {pk: f"{prefix}:{pk}" for pk in recipe_ids}
+
+
+def invalidate_recipes(recipe_ids):
+    keys = list(recipe_cache_keys(recipe_ids).values())
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedResponseMixin:
+    """Хранит отрендеренные JSON-ответы list и retrieve под ключом,
+    включающим версии cache_models, отдаёт их со строгим ETag и отвечает
+    304 на If-None-Match, не обращаясь к базе.
+
+    В ключ входят только параметры запроса из cache_query_params, так что
+    посторонние параметры не плодят записи. Тип ответа, путь и параметры
+    хешируются: ключ фиксированной длины без пробелов подходит и для
+    memcached.
+    """
+
+    cache_models = ()
+    cache_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_response_cache_key(self, request):
+        versions = ":".join(
+            model_version(model) for model in self.cache_models
+        )
+        query = urlencode([
+            (name, values)
+            for name, values in sorted(request.query_params.lists())
+            if name in self.cache_query_params
+        ], doseq=True)
+        digest = hashlib.sha1(
+            f"{request.accepted_media_type}\n{request.path}\n{query}"
+            .encode()
+        ).hexdigest()
+        return f"response:{versions}:{digest}"
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response = self.finalize_response(
+                request, response, *args, **kwargs
+            )
+            content = response.render().content
+            etag = f'"{hashlib.sha1(content).hexdigest()}"'
+            entry = (etag, content, dict(response.items()))
+            cache.set(
+                key, entry, cache_timeout(settings.RESPONSE_CACHE_TIMEOUT)
+            )
+        etag, content, headers = entry
+        if_none_match = {
+            tag.strip().removeprefix("W/")
+            for tag in request.headers.get("If-None-Match", "").split(",")
+        }
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponse(status=304)
+            del response["Content-Type"]
+            headers = {
+                name: value for name, value in headers.items()
+                if name.lower() != "content-type"
+            }
+        else:
+            response = HttpResponse(content)
+        for name, value in headers.items():
+            response[name] = value
+        response["ETag"] = etag
+        response["Cache-Control"] = (
+            f"public, max-age={settings.RESPONSE_CACHE_MAX_AGE}"
+        )
+        return response
@@ -0,0 +1,22 @@
+from django.core.checks import Tags, Warning, register
+
+from .cache import cache_is_shared
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [
+        Warning(
+            "Кеш по умолчанию хранится в памяти процесса: сброс кешей "
+            "рецептов, ответов и токенов не доходит до других воркеров, "
+            "и записи живут не дольше LOCAL_CACHE_MAX_TIMEOUT секунд.",
+            hint=(
+                "Задайте CACHE_BACKEND и CACHE_LOCATION, например "
+                "django.core.cache.backends.redis.RedisCache и "
+                "redis://redis:6379/1."
+            ),
+            id="api.W001",
+        )
+    ]
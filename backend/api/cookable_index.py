@@ -0,0 +1,207 @@
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import IngredientAmount
+
+from .cache import cache_is_shared
+
+VERSION_KEY = "cookable_index:version"
+CHANGE_KEY = "cookable_index:change:{}"
+
+
+class CookableIndex:
+    """Обратный индекс «ингредиент → рецепты» для подбора рецептов по
+    имеющимся продуктам.
+
+    Для каждого ингредиента хранится массив id рецептов, для каждого
+    рецепта — массив id его ингредиентов. Подбор складывает списки
+    рецептов выбранных ингредиентов и сортирует рецепты по доле
+    ингредиентов, которые уже есть, не обращаясь к базе.
+
+    После коммита сохранённый рецепт перечитывается из базы, а отдельно
+    добавленные и удалённые строки IngredientAmount применяются без
+    запроса. Каждое изменение увеличивает счётчик в общем кеше через
+    cache.incr и записывает в журнал под новым номером id рецепта.
+    Остальные процессы не чаще раза в COOKABLE_INDEX_CHECK_INTERVAL
+    секунд сравнивают счётчик со своим и перечитывают только рецепты из
+    журнала; целиком индекс строится заново, лишь если записей не
+    хватает (invalidate, вытеснение) или их больше
+    COOKABLE_INDEX_MAX_CHANGES. С кешем в памяти процесса журнал другим
+    процессам не виден, и они перестраивают индекс раз в интервал.
+    Массивы не меняются на месте, а заменяются новыми, поэтому чтение
+    идёт без блокировки.
+    """
+
+    typecode = "q"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+
+    @staticmethod
+    def _current_version():
+        cache.add(VERSION_KEY, 0, None)
+        return cache.get(VERSION_KEY, 0)
+
+    @staticmethod
+    def _next_version():
+        try:
+            return cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 0, None)
+            return cache.incr(VERSION_KEY)
+
+    def _build(self):
+        version = self._current_version()
+        postings, recipes = {}, {}
+        rows = IngredientAmount.objects.values_list(
+            "recipe_id", "ingredient_id"
+        ).order_by().iterator(chunk_size=10000)
+        for recipe_id, ingredient_id in rows:
+            postings.setdefault(
+                ingredient_id, array(self.typecode)
+            ).append(recipe_id)
+            recipes.setdefault(
+                recipe_id, array(self.typecode)
+            ).append(ingredient_id)
+        self._version = version
+        self._checked_at = self._built_at = time.monotonic()
+        self._data = postings, recipes
+
+    def _catch_up(self):
+        """Применяет изменения из журнала или, если их не восстановить,
+        строит индекс заново. Вызывается под блокировкой."""
+        version = self._current_version()
+        if version == self._version:
+            return
+        missed = range(self._version + 1, version + 1)
+        changes = {}
+        if 0 < len(missed) <= settings.COOKABLE_INDEX_MAX_CHANGES:
+            changes = cache.get_many(
+                [CHANGE_KEY.format(number) for number in missed]
+            )
+        if not missed or len(changes) < len(missed):
+            self._build()
+            return
+        recipe_ids = set(changes.values())
+        ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("recipe_id", "ingredient_id"):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id, new in ingredients.items():
+            self._replace(self._data, recipe_id, lambda old: new)
+        self._version = version
+
+    def _is_stale(self):
+        if self._data is None:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < settings.COOKABLE_INDEX_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        if not cache_is_shared():
+            return True
+        return self._current_version() != self._version
+
+    def _ensure(self):
+        data = self._data
+        if data is not None and not self._is_stale():
+            return data
+        with self._lock:
+            if self._data is None or (
+                not cache_is_shared()
+                and time.monotonic() - self._built_at
+                >= settings.COOKABLE_INDEX_CHECK_INTERVAL
+            ):
+                self._build()
+            else:
+                self._catch_up()
+            return self._data
+
+    def search(self, ingredient_ids, limit):
+        """Лучшие limit рецептов в виде (recipe_id, совпало, всего):
+        сначала по доле имеющихся ингредиентов, затем по их числу и по
+        новизне рецепта."""
+        postings, recipes = self._ensure()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        empty = ()
+        best = heapq.nlargest(limit, (
+            (count / (len(recipes.get(recipe_id, empty)) or count),
+             count, recipe_id)
+            for recipe_id, count in matched.items()
+        ))
+        return [
+            (recipe_id, count, len(recipes.get(recipe_id, empty)) or count)
+            for _, count, recipe_id in best
+        ]
+
+    def refresh_recipe(self, recipe_id):
+        """Перечитывает ингредиенты рецепта из базы; удалённый рецепт
+        из индекса убирается."""
+        self._apply(recipe_id, lambda old: IngredientAmount.objects.filter(
+            recipe_id=recipe_id
+        ).values_list("ingredient_id", flat=True))
+
+    def add(self, recipe_id, ingredient_id):
+        self._apply(recipe_id, lambda old: old | {ingredient_id})
+
+    def discard(self, recipe_id, ingredient_id):
+        self._apply(recipe_id, lambda old: old - {ingredient_id})
+
+    def _apply(self, recipe_id, change):
+        """Заменяет ингредиенты рецепта на change(старые) в индексе
+        текущего процесса и записывает изменение в журнал. Если до этого
+        счётчик менял другой процесс, его изменения подтянет _catch_up."""
+        with self._lock:
+            if self._data is not None:
+                self._replace(self._data, recipe_id, change)
+            version = self._next_version()
+            cache.set(
+                CHANGE_KEY.format(version), recipe_id,
+                settings.COOKABLE_INDEX_CHANGE_TIMEOUT,
+            )
+            if self._version == version - 1:
+                self._version = version
+
+    def _replace(self, data, recipe_id, change):
+        postings, recipes = data
+        old = set(recipes.get(recipe_id, ()))
+        new = set(change(old))
+        for ingredient_id in old - new:
+            postings[ingredient_id] = array(self.typecode, (
+                pk for pk in postings.get(ingredient_id, ()) if pk != recipe_id
+            ))
+        for ingredient_id in new - old:
+            posting = array(self.typecode, postings.get(ingredient_id, ()))
+            posting.append(recipe_id)
+            postings[ingredient_id] = posting
+        if new:
+            recipes[recipe_id] = array(self.typecode, sorted(new))
+        else:
+            recipes.pop(recipe_id, None)
+
+    def on_commit(self, method, *args):
+        transaction.on_commit(lambda: method(*args))
+
+    def invalidate(self):
+        """Строит индекс заново во всех процессах: номер без записи в
+        журнале не восстановить изменениями."""
+        with self._lock:
+            self._data = None
+            self._next_version()
+
+
+cookable_index = CookableIndex()
@@ -0,0 +1,49 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Способ сборки выбирает настройка FEED_STRATEGY:
+
+* "read" — лента собирается при чтении одним запросом к рецептам с
+  условием по подпискам. Публикация ничего не стоит, а чтение проходит
+  по индексу (author, pub_date) рецептов.
+* "write" — новый рецепт сразу раскладывается по лентам подписчиков в
+  таблицу FeedEntry, подписка добавляет в ленту рецепты автора, отписка
+  их убирает. Чтение — одна выборка по индексу (user, pub_date), а цена
+  переносится на публикацию и растёт с числом подписчиков автора.
+
+Ленты FeedEntry ведутся только при стратегии "write"; после её
+включения таблицу заполняет команда rebuild_feed. Сравнить стратегии на
+своих данных можно командой bench_feed.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from users.models import Follow
+
+from .pagination import FeedPagination, KeysetPagination
+
+
+def read_feed(queryset, user):
+    return queryset.filter(
+        author__in=Follow.objects.filter(user=user).values("author")
+    ), KeysetPagination()
+
+
+def write_feed(queryset, user):
+    return queryset.filter(feed_entries__user=user).annotate(
+        feed_pub_date=F("feed_entries__pub_date"),
+        feed_recipe=F("feed_entries__recipe"),
+    ), FeedPagination()
+
+
+STRATEGIES = {"read": read_feed, "write": write_feed}
+
+
+def user_feed(queryset, user, strategy=None):
+    """Рецепты ленты пользователя из queryset и постраничный вывод для
+    них."""
+    strategy = strategy or settings.FEED_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ImproperlyConfigured(
+            f"FEED_STRATEGY должна быть одной из: {', '.join(STRATEGIES)}"
+        )
+    return STRATEGIES[strategy](queryset, user)
@@ -1,7 +1,10 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(SearchFilter):
@@ -12,16 +15,46 @@ class IngredientFilter(SearchFilter):
         fields = ("name",)
 
 
+class SlugsField(forms.Field):
+    """Все непустые значения параметра, переданного несколько раз."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [slug for slug in value or () if slug]
+
+
+class SlugsFilter(filters.Filter):
+    field_class = SlugsField
+
+
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
-    )
+    tags = SlugsFilter(method="filter_tags")
+    search = filters.CharFilter(method="filter_search")
     is_favorited = filters.NumberFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.NumberFilter(
         method="filter_is_in_shopping_cart")
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов ?tags=a&tags=b.
+
+        Полусоединение через EXISTS по промежуточной таблице не размножает
+        строки рецепта, поэтому не нужны DISTINCT и отдельный запрос за
+        тегами, а COUNT пагинации идёт по самим рецептам.
+        """
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef("pk"), tag__slug__in=value
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию. Постраничный
+        вывод по номерам идёт по убыванию релевантности, курсорный
+        сохраняет свой порядок по дате."""
+        return search_recipes(queryset, value).order_by(
+            "-search_rank", *Recipe._meta.ordering
+        )
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorites__user=self.request.user)
@@ -34,4 +67,10 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "tags",
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+        )
@@ -0,0 +1,83 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import Ingredient
+
+from .cache import bump_model_version, model_version
+
+
+class IngredientIndex:
+    """Отсортированный по названию массив ингредиентов для поиска по
+    началу названия без обращения к базе.
+
+    Индекс строится при первом запросе в каждом процессе. Сохранение или
+    удаление ингредиента сбрасывает его в текущем процессе и меняет версию
+    модели в общем кеше, по которой остальные процессы перестраивают свой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _build(self):
+        from .serializers import IngredientSerializer
+
+        version = model_version(Ingredient)
+        items = IngredientSerializer(
+            Ingredient.objects.all(), many=True
+        ).data
+        items = sorted(
+            items,
+            key=lambda item: (item["name"].casefold(), item["name"],
+                              item["id"]),
+        )
+        names = [item["name"].casefold() for item in items]
+        self._version = version
+        self._checked_at = time.monotonic()
+        self._data = names, items
+        return self._data
+
+    def _is_stale(self):
+        if self._data is None:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < settings.INGREDIENT_INDEX_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        return model_version(Ingredient) != self._version
+
+    def _ensure(self):
+        data = self._data
+        if data is None or self._is_stale():
+            with self._lock:
+                data = self._build()
+        return data
+
+    def search(self, prefix, limit=None):
+        names, items = self._ensure()
+        prefix = prefix.casefold()
+        start = bisect_left(names, prefix)
+        end = bisect_right(names, prefix + "\U0010ffff", lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return items[start:end]
+
+    def invalidate(self):
+        """Сбрасывает индекс сейчас и ещё раз после коммита, чтобы не
+        остался индекс, построенный по данным до коммита."""
+
+        def reset():
+            self._data = None
+
+        reset()
+        bump_model_version(Ingredient)
+        transaction.on_commit(reset)
+
+
+ingredient_index = IngredientIndex()
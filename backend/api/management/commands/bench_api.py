@@ -0,0 +1,288 @@
+import json
+import random
+import tempfile
+import tracemalloc
+from base64 import b64encode
+from io import BytesIO, StringIO
+from itertools import count
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmarks import (create_recipes, measure, rolled_back,
+                            with_on_commit)
+from api.cookable_index import cookable_index
+from api.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.search import index_recipes
+from users.models import Follow, User
+
+QUERY_BUDGETS = {
+    "recipe_list": 8,
+    "recipe_list_tags": 8,
+    "recipe_list_favorited": 8,
+    "recipe_list_author": 8,
+    "recipe_search": 8,
+    "recipe_detail": 6,
+    "feed": 6,
+    "what_can_i_cook": 4,
+    "subscriptions": 6,
+    "ingredient_search": 2,
+    "download_shopping_cart": 3,
+    "recipe_create": 24,
+    "recipe_update": 28,
+}
+
+
+def image_data_uri():
+    buffer = BytesIO()
+    Image.new("RGB", (64, 48), (200, 120, 40)).save(buffer, "PNG")
+    return "data:image/png;base64," + b64encode(buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет число запросов, задержку p50/p95 и выделение памяти "
+        "основных запросов API на сгенерированных данных вместе с работой "
+        "после коммита, пишет результат в JSON и завершается ошибкой при "
+        "превышении порогов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--tags", type=int, default=12)
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", default="bench_api.json",
+            help="Файл для результатов в JSON",
+        )
+        parser.add_argument(
+            "--thresholds",
+            help=(
+                "JSON с порогами вида {сценарий: {queries, p95, "
+                "alloc_peak_kb}}; дополняет встроенные пороги числа "
+                "запросов"
+            ),
+        )
+        parser.add_argument(
+            "--only", nargs="+", help="Запустить только эти сценарии"
+        )
+
+    def handle(self, *args, **options):
+        thresholds = {
+            name: {"queries": budget}
+            for name, budget in QUERY_BUDGETS.items()
+        }
+        if options["thresholds"]:
+            with open(options["thresholds"], encoding="utf-8") as file:
+                for name, limits in json.load(file).items():
+                    thresholds.setdefault(name, {}).update(limits)
+        rng = random.Random(options["seed"])
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, RECIPE_IMAGE_SYNC=True
+        ), rolled_back():
+            data = self.generate(options, rng)
+            results = self.run(data, options, rng)
+        report = {
+            "database": connection.vendor,
+            "dataset": {
+                key: options[key] for key in ("users", "recipes", "tags")
+            },
+            "repeat": options["repeat"],
+            "scenarios": results,
+        }
+        failures = self.find_failures(results, thresholds)
+        report["failures"] = failures
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты записаны в {options['output']}")
+        if failures:
+            raise CommandError(
+                "Превышены пороги:\n" + "\n".join(failures)
+            )
+
+    def generate(self, options, rng):
+        if not Ingredient.objects.exists():
+            call_command("load_ingredients", stdout=StringIO())
+        ingredients = list(
+            Ingredient.objects.order_by("id").values_list("id", "name")
+        )
+        ingredient_ids = [pk for pk, _ in ingredients]
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"bench{i}", slug=f"bench-{i}", color=f"#{i:06x}")
+            for i in range(options["tags"])
+        )
+        authors = User.objects.bulk_create(
+            User(
+                username=f"bench_api_{number}",
+                email=f"bench_api_{number}@example.org",
+            )
+            for number in range(options["users"])
+        )
+        per_author, extra = divmod(options["recipes"], len(authors))
+        for number, author in enumerate(authors):
+            create_recipes(
+                author, per_author + (number < extra), options["batch_size"],
+                tags=lambda: [
+                    tag.pk for tag in rng.sample(tags, rng.randint(1, 3))
+                ],
+                ingredients=lambda: rng.sample(
+                    ingredient_ids, rng.randint(4, 12)
+                ),
+            )
+        user = User.objects.create(
+            username="bench_api", email="bench_api@example.org"
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(author__in=authors)
+            .values_list("id", flat=True)
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe_id=recipe_id)
+            for recipe_id in rng.sample(recipe_ids, min(50, len(recipe_ids)))
+        )
+        cart = rng.sample(recipe_ids, min(20, len(recipe_ids)))
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe_id=recipe_id) for recipe_id in cart
+        )
+        ShoppingListItem.objects.add_recipes(cart, [user.pk])
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for author in rng.sample(authors, min(30, len(authors)))
+        )
+        index_recipes()
+        cookable_index.invalidate()
+        ingredient_index.invalidate()
+        if settings.FEED_STRATEGY == "write":
+            call_command("rebuild_feed", stdout=StringIO())
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}"
+        )
+        return {
+            "client": client,
+            "author": authors[0],
+            "tags": [tag.pk for tag in tags],
+            "tag_slugs": [tag.slug for tag in tags],
+            "ingredients": ingredient_ids,
+            "prefixes": sorted({name[:2] for _, name in ingredients}),
+            "recipes": recipe_ids,
+            "recipe_names": sorted(
+                Recipe.objects.filter(author__in=authors)
+                .values_list("name", flat=True).distinct()
+            ),
+        }
+
+    def scenarios(self, data, rng):
+        client = data["client"]
+        image = image_data_uri()
+        numbers = count()
+
+        def recipe_payload():
+            return {
+                "name": f"Замер {next(numbers)}",
+                "text": "Описание",
+                "cooking_time": rng.randint(1, 120),
+                "image": image,
+                "tags": rng.sample(data["tags"], 2),
+                "ingredients": [
+                    {"id": ingredient_id, "amount": rng.randint(1, 500)}
+                    for ingredient_id in rng.sample(data["ingredients"], 8)
+                ],
+            }
+
+        own = with_on_commit(lambda: client.post(
+            "/api/recipes/", recipe_payload(), format="json"
+        ))()
+        own_id = own.json()["id"]
+        return {
+            "recipe_list": lambda: client.get("/api/recipes/"),
+            "recipe_list_tags": lambda: client.get(
+                "/api/recipes/", {"tags": rng.sample(data["tag_slugs"], 2)}
+            ),
+            "recipe_list_favorited": lambda: client.get(
+                "/api/recipes/", {"is_favorited": 1}
+            ),
+            "recipe_list_author": lambda: client.get(
+                "/api/recipes/", {"author": data["author"].pk}
+            ),
+            "recipe_search": lambda: client.get(
+                "/api/recipes/",
+                {"search": rng.choice(data["recipe_names"])},
+            ),
+            "recipe_detail": lambda: client.get(
+                f"/api/recipes/{rng.choice(data['recipes'])}/"
+            ),
+            "feed": lambda: client.get("/api/recipes/feed/"),
+            "what_can_i_cook": lambda: client.get(
+                "/api/recipes/what_can_i_cook/",
+                {"ingredients": rng.sample(data["ingredients"], 8)},
+            ),
+            "subscriptions": lambda: client.get("/api/users/subscriptions/"),
+            "ingredient_search": lambda: client.get(
+                "/api/ingredients/", {"name": rng.choice(data["prefixes"])}
+            ),
+            "download_shopping_cart": lambda: client.get(
+                "/api/recipes/download_shopping_cart/"
+            ),
+            "recipe_create": lambda: client.post(
+                "/api/recipes/", recipe_payload(), format="json"
+            ),
+            "recipe_update": lambda: client.patch(
+                f"/api/recipes/{own_id}/", recipe_payload(), format="json"
+            ),
+        }
+
+    def run(self, data, options, rng):
+        results = {}
+        for name, request in self.scenarios(data, rng).items():
+            if options["only"] and name not in options["only"]:
+                continue
+            request = with_on_commit(request)
+            request()
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            query_count = len(queries)
+            timing = measure(request, options["repeat"])
+            tracemalloc.start()
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = {
+                "status": response.status_code,
+                "queries": query_count,
+                "p50": round(timing["p50"], 2),
+                "p95": round(timing["p95"], 2),
+                "mean": round(timing["mean"], 2),
+                "alloc_peak_kb": round(peak / 1024, 1),
+            }
+            self.stdout.write(
+                f"{name:>24}: {response.status_code}, "
+                f"запросов {query_count}, "
+                f"p50 {timing['p50']:.1f} мс, p95 {timing['p95']:.1f} мс, "
+                f"память {peak / 1024:.0f} КБ"
+            )
+        return results
+
+    @staticmethod
+    def find_failures(results, thresholds):
+        failures = []
+        for name, result in results.items():
+            if result["status"] >= 400:
+                failures.append(f"{name}: ответ {result['status']}")
+            for metric, limit in thresholds.get(name, {}).items():
+                if result[metric] > limit:
+                    failures.append(
+                        f"{name}: {metric} {result[metric]} > {limit}"
+                    )
+        return failures
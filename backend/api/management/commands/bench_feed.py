@@ -0,0 +1,168 @@
+import random
+import time
+from collections import Counter
+from io import StringIO
+from itertools import accumulate
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.benchmarks import (create_recipes, measure, rolled_back,
+                            weighted_sample)
+from api.feed import STRATEGIES, user_feed
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает ленту подписок, собранную при чтении, и ленту из "
+        "таблицы FeedEntry: время первой и глубокой страницы и цену "
+        "публикации рецепта у авторов с разным числом подписчиков"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=1000)
+        parser.add_argument("--readers", type=int, default=3000)
+        parser.add_argument("--recipes", type=int, default=30_000)
+        parser.add_argument(
+            "--depth", type=int, default=20,
+            help="Номер страницы для замера глубокой страницы",
+        )
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with rolled_back():
+            readers = self.generate(options, rng)
+            self.run(readers, options["depth"], options["repeat"])
+
+    def generate(self, options, rng):
+        """Авторы с числом подписчиков по закону Ципфа и читатели с
+        логнормальным числом подписок; рецепты распределены по авторам
+        случайно."""
+        authors = User.objects.bulk_create(
+            User(
+                username=f"bench_feed_author_{number}",
+                email=f"bench_feed_author_{number}@example.org",
+            )
+            for number in range(options["authors"])
+        )
+        readers = User.objects.bulk_create(
+            User(
+                username=f"bench_feed_reader_{number}",
+                email=f"bench_feed_reader_{number}@example.org",
+            )
+            for number in range(options["readers"])
+        )
+        cum_weights = list(accumulate(
+            1 / rank for rank in range(1, len(authors) + 1)
+        ))
+        recipes = Counter(rng.choices(authors, k=options["recipes"]))
+        for author, count in recipes.items():
+            create_recipes(author, count, options["batch_size"])
+        Follow.objects.bulk_create(
+            (
+                Follow(user=reader, author=author)
+                for reader in readers
+                for author in weighted_sample(
+                    rng, authors, cum_weights,
+                    min(len(authors), max(1, int(rng.lognormvariate(3, 1)))),
+                )
+            ),
+            batch_size=options["batch_size"],
+        )
+        start = time.perf_counter()
+        call_command("rebuild_feed", stdout=StringIO())
+        self.stdout.write(
+            f"Авторов: {len(authors)}, читателей: {len(readers)}, "
+            f"рецептов: {options['recipes']}, "
+            f"подписок: {Follow.objects.filter(user__in=readers).count()}, "
+            f"записей в лентах: {FeedEntry.objects.count()} "
+            f"(заполнение {(time.perf_counter() - start) * 1000:.0f} мс)"
+        )
+        return readers
+
+    @staticmethod
+    def page(strategy, user, cursor=None):
+        params = {"cursor": cursor} if cursor else {}
+        request = Request(RequestFactory().get("/api/recipes/feed/", params))
+        queryset, paginator = user_feed(Recipe.objects.all(), user, strategy)
+        page = paginator.paginate_queryset(queryset, request)
+        return page, paginator.get_next_link()
+
+    def deep_cursor(self, user, depth):
+        cursor = None
+        for _ in range(depth - 1):
+            _, link = self.page("read", user, cursor)
+            if link is None:
+                return None
+            cursor = parse_qs(urlparse(link).query)["cursor"][0]
+        return cursor
+
+    def run(self, readers, depth, repeat):
+        sample = random.Random(0).sample(readers, min(repeat, len(readers)))
+        cursors = [
+            (user, self.deep_cursor(user, depth)) for user in sample
+        ]
+        cursors = [(user, cursor) for user, cursor in cursors if cursor]
+        for strategy in STRATEGIES:
+            queryset, paginator = user_feed(
+                Recipe.objects.all(), sample[0], strategy
+            )
+            queryset = queryset.order_by(*paginator.ordering)
+            self.stdout.write(f"--- {strategy}\n{queryset.explain()}")
+            for label, pages in (
+                ("первая страница", [(user, None) for user in sample]),
+                (f"страница {depth}", cursors),
+            ):
+                if not pages:
+                    continue
+                iterator = iter(pages)
+                timing = measure(
+                    lambda: self.page(strategy, *next(iterator)), len(pages)
+                )
+                self.stdout.write(
+                    f"{strategy}, {label}: p50 {timing['p50']:.2f} мс, "
+                    f"p95 {timing['p95']:.2f} мс, "
+                    f"среднее {timing['mean']:.2f} мс"
+                )
+        self.publish()
+        for user in sample[:10]:
+            read, _ = self.page("read", user)
+            write, _ = self.page("write", user)
+            if [recipe.pk for recipe in read] != [
+                recipe.pk for recipe in write
+            ]:
+                self.stderr.write(f"Ленты расходятся у {user}")
+
+    def publish(self):
+        """Время раскладки нового рецепта по лентам для самого
+        популярного автора, медианного и самого непопулярного."""
+        authors = list(
+            Follow.objects.values("author").annotate(
+                followers=Count("user")
+            ).order_by("-followers").values_list("author", "followers")
+        )
+        for author_id, followers in (
+            authors[0], authors[len(authors) // 2], authors[-1]
+        ):
+            recipe = Recipe.objects.create(
+                author_id=author_id,
+                name="Новый рецепт",
+                text="Описание",
+                image="recipes/bench.png",
+                cooking_time=30,
+            )
+            FeedEntry.objects.filter(recipe=recipe).delete()
+            timing = measure(lambda: FeedEntry.objects.fan_out(recipe), 1)
+            self.stdout.write(
+                f"Публикация у автора с {followers} подписчиками: "
+                f"read 0 мс, write {timing['mean']:.1f} мс"
+            )
@@ -0,0 +1,65 @@
+import random
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import measure, rolled_back
+from api.ingredient_index import ingredient_index
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск ингредиентов по началу названия через фильтр "
+        "^name и через индекс в памяти"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if not Ingredient.objects.exists():
+                call_command("load_ingredients", stdout=StringIO())
+            ingredient_index.invalidate()
+            self.run(options["queries"], random.Random(options["seed"]))
+
+    def run(self, queries, rng):
+        names = list(Ingredient.objects.values_list("name", flat=True))
+        prefixes = [
+            name[:rng.randint(1, 4)] for name in rng.choices(names, k=queries)
+        ]
+        ingredient_index.search("")
+        results = {}
+        for label, search in (
+            ("filter", self.search_database),
+            ("index", ingredient_index.search),
+        ):
+            iterator = iter(prefixes)
+            results[label] = measure(
+                lambda: search(next(iterator)), len(prefixes)
+            )
+        for label, timing in results.items():
+            self.stdout.write(
+                f"{label:>6}: p50 {timing['p50']:.3f} мс, "
+                f"p95 {timing['p95']:.3f} мс, "
+                f"среднее {timing['mean']:.3f} мс"
+            )
+        for prefix in prefixes[:20]:
+            expected = sorted(
+                self.search_database(prefix), key=lambda item: item["id"]
+            )
+            found = sorted(
+                ingredient_index.search(prefix), key=lambda item: item["id"]
+            )
+            if expected != found:
+                self.stderr.write(f"Результаты расходятся для «{prefix}»")
+
+    @staticmethod
+    def search_database(prefix):
+        return IngredientSerializer(
+            Ingredient.objects.filter(name__istartswith=prefix), many=True
+        ).data
@@ -0,0 +1,112 @@
+import json
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks import measure
+from api.metrics import MetricsMiddleware, QueryCounter, registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет накладные расходы метрик: запись одного запроса, сброс "
+        "в файл, сборку /api/metrics/ по файлам воркеров и время ответа "
+        "API с MetricsMiddleware и без него"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=100_000)
+        parser.add_argument("--views", type=int, default=40)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--path", default="/api/tags/")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=float("inf")
+        ):
+            self.record(options["records"], options["views"])
+            self.flush_and_render(Path(directory), options["workers"])
+            self.requests(options["path"], options["requests"])
+
+    def record(self, count, views):
+        """Записывает count синтетических запросов по всем сочетаниям
+        обработчика, метода и статуса и проверяет число рядов."""
+        names = {f"View{view}.list" for view in range(views)}
+        requests = [
+            SimpleNamespace(view_name=name, method=method)
+            for name in sorted(names)
+            for method in ("GET", "POST", "DELETE")
+        ]
+        responses = [
+            SimpleNamespace(status_code=status)
+            for status in (200, 201, 204, 400, 404)
+        ]
+        queries = QueryCounter()
+        queries.count = 3
+        start = time.perf_counter()
+        for number in range(count):
+            MetricsMiddleware.record(
+                requests[number % len(requests)],
+                responses[number // len(requests) % len(responses)],
+                start, queries,
+            )
+        elapsed = time.perf_counter() - start
+        series = sum(
+            1 for _, labels in (*registry.counters, *registry.histograms)
+            if dict(labels)["view"] in names
+        )
+        # Запросы по обработчику, методу и статусу, гистограмма по
+        # обработчику и методу и число SQL-запросов по обработчику.
+        combinations = min(count, len(requests) * len(responses))
+        expected = (
+            combinations + min(count, len(requests)) + min(count, views)
+        )
+        self.stdout.write(
+            f"Запись запроса: {elapsed / count * 1e6:.2f} мкс, "
+            f"рядов в реестре: {series}"
+        )
+        if series != expected:
+            raise CommandError(
+                f"Ожидалось {expected} рядов синтетических обработчиков, "
+                f"записано {series}"
+            )
+
+    def flush_and_render(self, directory, workers):
+        flush = measure(registry.flush, 20)
+        self.stdout.write(f"Сброс в файл: {flush['mean']:.2f} мс")
+        snapshot = json.dumps(registry.snapshot())
+        for worker in range(1, workers):
+            (directory / f"worker-{worker}.json").write_text(snapshot)
+        render = measure(registry.render, 20)
+        self.stdout.write(
+            f"Сборка /api/metrics/ по {workers} файлам: "
+            f"{render['mean']:.2f} мс, "
+            f"{len(registry.render()) // 1024} КБ текста"
+        )
+
+    def requests(self, path, count):
+        without = [
+            name for name in settings.MIDDLEWARE
+            if name != "api.metrics.MetricsMiddleware"
+        ]
+        for label, middleware in (
+            ("без метрик", without),
+            ("с метриками", settings.MIDDLEWARE),
+        ) * 2:
+            with override_settings(
+                MIDDLEWARE=middleware, REQUEST_TIMING_SAMPLE_RATE=0
+            ):
+                client = APIClient()
+                client.get(path)
+                timing = measure(lambda: client.get(path), count)
+            self.stdout.write(
+                f"{path} {label}: p50 {timing['p50']:.3f} мс, "
+                f"p95 {timing['p95']:.3f} мс"
+            )
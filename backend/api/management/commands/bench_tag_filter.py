@@ -0,0 +1,100 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.benchmarks import create_recipes, measure, rolled_back
+from api.filters import RecipeFilter
+from api.pagination import CustomPagination
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает фильтр рецептов по тегам через JOIN с DISTINCT и через "
+        "EXISTS: планы запросов и время первой страницы с COUNT"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100_000)
+        parser.add_argument("--tags", type=int, default=12)
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with rolled_back():
+            tags = self.generate(
+                options["recipes"], options["tags"], options["batch_size"],
+                rng,
+            )
+            self.run(tags, options["repeat"], rng)
+
+    def generate(self, recipes, tags, batch_size, rng):
+        author = User.objects.create(
+            username="bench_tag_filter", email="bench_tag_filter@example.org"
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"bench {i}", slug=f"bench-{i}", color=f"#{i:06x}")
+            for i in range(tags)
+        )
+        create_recipes(
+            author, recipes, batch_size,
+            tags=lambda: [
+                tag.pk for tag in rng.sample(tags, rng.randint(3, 5))
+            ],
+        )
+        self.stdout.write(
+            f"Рецептов: {recipes}, связей с тегами: "
+            f"{Recipe.tags.through.objects.filter(tag__in=tags).count()}"
+        )
+        return [tag.slug for tag in tags]
+
+    @staticmethod
+    def join_filter(slugs):
+        """Прежний ModelMultipleChoiceFilter по tags__slug."""
+        tags = list(Tag.objects.filter(slug__in=slugs))
+        condition = Q()
+        for tag in tags:
+            condition |= Q(tags__slug=tag.slug)
+        return Recipe.objects.filter(condition).distinct()
+
+    @staticmethod
+    def exists_filter(slugs):
+        request = Request(RequestFactory().get("/", {"tags": slugs}))
+        return RecipeFilter(
+            request.query_params, Recipe.objects.all(), request=request
+        ).qs
+
+    def run(self, slugs, repeat, rng):
+        page_size = CustomPagination.page_size
+        samples = [rng.sample(slugs, rng.randint(1, 3)) for _ in range(repeat)]
+        for label, build in (
+            ("join", self.join_filter),
+            ("exists", self.exists_filter),
+        ):
+            queryset = build(samples[0])
+            self.stdout.write(f"--- {label}\n{queryset.explain()}")
+            iterator = iter(samples)
+
+            def first_page():
+                queryset = build(next(iterator))
+                return queryset.count(), list(queryset[:page_size])
+
+            timing = measure(first_page, repeat)
+            self.stdout.write(
+                f"{label}: p50 {timing['p50']:.1f} мс, "
+                f"p95 {timing['p95']:.1f} мс, "
+                f"среднее {timing['mean']:.1f} мс"
+            )
+        for sample in samples[:5]:
+            join, exists = self.join_filter(sample), self.exists_filter(sample)
+            if (
+                join.count() != exists.count()
+                or list(join[:page_size]) != list(exists[:page_size])
+            ):
+                self.stderr.write(f"Результаты расходятся для {sample}")
@@ -0,0 +1,93 @@
+import random
+from io import StringIO
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from api.benchmarks import (create_recipes, measure, rolled_back,
+                            weighted_sample)
+from api.cookable_index import cookable_index
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает подбор рецептов по имеющимся ингредиентам через "
+        "GROUP BY в базе и через обратный индекс в памяти"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with rolled_back():
+            if not Ingredient.objects.exists():
+                call_command("load_ingredients", stdout=StringIO())
+            ingredient_ids = list(
+                Ingredient.objects.order_by("id").values_list("id", flat=True)
+            )
+            rng.shuffle(ingredient_ids)
+            cum_weights = list(accumulate(
+                1 / rank for rank in range(1, len(ingredient_ids) + 1)
+            ))
+            author = User.objects.create(
+                username="bench_what_can_i_cook",
+                email="bench_what_can_i_cook@example.org",
+            )
+            create_recipes(
+                author, options["recipes"], options["batch_size"],
+                ingredients=lambda: weighted_sample(
+                    rng, ingredient_ids, cum_weights, rng.randint(4, 10)
+                ),
+            )
+            pantries = [
+                weighted_sample(
+                    rng, ingredient_ids, cum_weights, rng.randint(5, 15)
+                )
+                for _ in range(options["queries"])
+            ]
+            cookable_index.invalidate()
+            self.run(pantries, options["limit"])
+
+    @staticmethod
+    def search_database(ingredient_ids, limit):
+        recipes = Recipe.objects.annotate(
+            total=Count("ingredient_amount"),
+            matched=Count(
+                "ingredient_amount",
+                filter=Q(ingredient_amount__ingredient__in=ingredient_ids),
+            ),
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast("matched", FloatField()) / F("total")
+        ).order_by("-coverage", "-matched", "-id")
+        return list(recipes.values_list("id", "matched", "total")[:limit])
+
+    def run(self, pantries, limit):
+        build = measure(lambda: cookable_index.search([], limit), 1)
+        self.stdout.write(f"Построение индекса: {build['mean']:.0f} мс")
+        for label, search in (
+            ("database", self.search_database),
+            ("index", cookable_index.search),
+        ):
+            iterator = iter(pantries)
+            timing = measure(
+                lambda: search(next(iterator), limit), len(pantries)
+            )
+            self.stdout.write(
+                f"{label:>8}: p50 {timing['p50']:.2f} мс, "
+                f"p95 {timing['p95']:.2f} мс, "
+                f"среднее {timing['mean']:.2f} мс"
+            )
+        for pantry in pantries[:10]:
+            expected = self.search_database(pantry, limit)
+            if expected != cookable_index.search(pantry, limit):
+                self.stderr.write(f"Результаты расходятся для {pantry}")
@@ -0,0 +1,281 @@
+import random
+import time
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from api.benchmarks import weighted_sample, zipf_weights
+from api.cache import bump_model_version
+from api.cookable_index import cookable_index
+from api.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag)
+from recipes.search import index_recipes
+from users.models import Follow, User
+
+IMAGE = "recipes/dataset.png"
+FIRST_NAMES = (
+    "Анна", "Борис", "Вера", "Глеб", "Дарья", "Егор", "Жанна", "Илья",
+    "Ксения", "Лев", "Мария", "Никита", "Ольга", "Павел", "Софья", "Тимур",
+)
+LAST_NAMES = (
+    "Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Соколова",
+    "Лебедев", "Козлова", "Новиков", "Морозова", "Волков", "Зайцева",
+)
+DISHES = (
+    "Суп", "Салат", "Пирог", "Рагу", "Омлет", "Паста", "Плов", "Запеканка",
+    "Каша", "Котлеты", "Блины", "Соус", "Десерт", "Хлеб", "Смузи",
+)
+STYLES = (
+    "домашний", "быстрый", "праздничный", "летний", "острый", "постный",
+    "бабушкин", "по-грузински", "с зеленью", "на скорую руку",
+)
+
+
+def skewed_sample(rng, population, cum_weights, k):
+    """До k разных элементов: популярные выпадают чаще."""
+    k = min(k, len(population))
+    if k * 2 > len(population):
+        return rng.sample(population, k)
+    return weighted_sample(rng, population, cum_weights, k)
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт синтетические данные для нагрузочного тестирования: "
+        "пользователей, рецепты с ингредиентами из data/ingredients.csv и "
+        "тегами, избранное, корзины и подписки с популярностью по закону "
+        "Ципфа, затем пересчитывает производные данные"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--recipes", type=int, default=50_000)
+        parser.add_argument(
+            "--authors-share", type=float, default=0.2,
+            help="Доля пользователей, публикующих рецепты",
+        )
+        parser.add_argument("--tags", type=int, default=12)
+        parser.add_argument(
+            "--ingredients-per-recipe", type=int, nargs=2, default=(3, 12),
+            metavar=("MIN", "MAX"),
+        )
+        parser.add_argument(
+            "--favorites", type=float, default=15,
+            help="Среднее число рецептов в избранном у пользователя",
+        )
+        parser.add_argument(
+            "--cart", type=float, default=3,
+            help="Среднее число рецептов в корзине у пользователя",
+        )
+        parser.add_argument(
+            "--follows", type=float, default=10,
+            help="Среднее число подписок у пользователя",
+        )
+        parser.add_argument("--prefix", default="user")
+        parser.add_argument("--password", default="foodgram-load")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+            username__startswith=options["prefix"]
+        ).exists():
+            raise CommandError(
+                f"Пользователи с префиксом {options['prefix']!r} уже есть, "
+                "укажите другой --prefix"
+            )
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.rows = 0
+        started = time.perf_counter()
+        ingredients, ingredient_weights = self.ingredients()
+        tags, tag_weights = self.tags(options["tags"])
+        users = self.users(options)
+        authors = users[:max(1, int(len(users) * options["authors_share"]))]
+        recipes = self.recipes(
+            options, authors, tags, tag_weights, ingredients,
+            ingredient_weights,
+        )
+        self.relations(options, users, authors, recipes)
+        self.stdout.write(
+            f"Создано строк: {self.rows} за "
+            f"{time.perf_counter() - started:.0f} с"
+        )
+        self.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {time.perf_counter() - started:.0f} с"
+        ))
+
+    def bulk_create(self, model, objects, **kwargs):
+        """Создаёт объекты пачками по batch_size, каждую в своей
+        транзакции, и возвращает созданные объекты."""
+        created, batch = [], []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                created.extend(self.save_batch(model, batch, **kwargs))
+                batch = []
+        created.extend(self.save_batch(model, batch, **kwargs))
+        return created
+
+    def save_batch(self, model, batch, **kwargs):
+        if not batch:
+            return []
+        with transaction.atomic():
+            objects = model.objects.bulk_create(batch, **kwargs)
+        self.rows += len(objects)
+        return objects
+
+    def phase(self, name, started, count):
+        self.stdout.write(
+            f"{name}: {count} за {time.perf_counter() - started:.1f} с"
+        )
+
+    def ingredients(self):
+        if not Ingredient.objects.exists():
+            call_command("load_ingredients", stdout=StringIO())
+        ids = list(Ingredient.objects.values_list("id", flat=True))
+        self.rng.shuffle(ids)
+        return ids, zipf_weights(len(ids))
+
+    def tags(self, count):
+        existing = Tag.objects.count()
+        Tag.objects.bulk_create(
+            Tag(
+                name=f"тег{number}",
+                slug=f"tag-{number}",
+                color=f"#{self.rng.randrange(0x1000000):06x}",
+            )
+            for number in range(existing, count)
+        )
+        bump_model_version(Tag)
+        ids = list(Tag.objects.values_list("id", flat=True))
+        self.rng.shuffle(ids)
+        return ids, zipf_weights(len(ids))
+
+    def users(self, options):
+        started = time.perf_counter()
+        password = make_password(options["password"])
+        prefix = options["prefix"]
+        users = self.bulk_create(User, (
+            User(
+                username=f"{prefix}{number}",
+                email=f"{prefix}{number}@example.org",
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for number in range(options["users"])
+        ))
+        self.phase("Пользователи", started, len(users))
+        return users
+
+    def recipes(self, options, authors, tags, tag_weights, ingredients,
+                ingredient_weights):
+        started = time.perf_counter()
+        rng = self.rng
+        if not default_storage.exists(IMAGE):
+            buffer = BytesIO()
+            Image.new("RGB", (480, 320), (230, 180, 120)).save(buffer, "PNG")
+            default_storage.save(IMAGE, ContentFile(buffer.getvalue()))
+        author_weights = zipf_weights(len(authors))
+        low, high = options["ingredients_per_recipe"]
+        recipe_ids = []
+        for start in range(0, options["recipes"], self.batch_size):
+            size = min(self.batch_size, options["recipes"] - start)
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author=author,
+                        name=f"{rng.choice(DISHES)} {rng.choice(STYLES)} "
+                             f"№{start + number}",
+                        text="Описание рецепта для нагрузочного теста",
+                        image=IMAGE,
+                        cooking_time=rng.randint(5, 180),
+                    )
+                    for number, author in enumerate(rng.choices(
+                        authors, cum_weights=author_weights, k=size
+                    ))
+                )
+                links = Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in skewed_sample(
+                        rng, tags, tag_weights, rng.randint(1, 3)
+                    )
+                )
+                amounts = IngredientAmount.objects.bulk_create(
+                    IngredientAmount(
+                        recipe_id=recipe.pk,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+                    for recipe in recipes
+                    for ingredient_id in skewed_sample(
+                        rng, ingredients, ingredient_weights,
+                        rng.randint(low, high),
+                    )
+                )
+            self.rows += len(recipes) + len(links) + len(amounts)
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+        self.phase("Рецепты", started, len(recipe_ids))
+        return recipe_ids
+
+    def relations(self, options, users, authors, recipes):
+        rng = self.rng
+        popular = list(recipes)
+        rng.shuffle(popular)
+        recipe_weights = zipf_weights(len(popular))
+        author_ids = [author.pk for author in authors]
+        author_weights = zipf_weights(len(author_ids))
+        for model, average in (
+            (Favorite, options["favorites"]),
+            (ShoppingCart, options["cart"]),
+        ):
+            started = time.perf_counter()
+            created = self.bulk_create(model, (
+                model(user_id=user.pk, recipe_id=recipe_id)
+                for user in users
+                for recipe_id in skewed_sample(
+                    rng, popular, recipe_weights,
+                    round(rng.expovariate(1 / average)) if average else 0,
+                )
+            ))
+            self.phase(model._meta.verbose_name_plural, started, len(created))
+        started = time.perf_counter()
+        created = self.bulk_create(Follow, (
+            Follow(user_id=user.pk, author_id=author_id)
+            for user in users
+            for author_id in skewed_sample(
+                rng, author_ids, author_weights,
+                round(rng.expovariate(1 / options["follows"]))
+                if options["follows"] else 0,
+            )
+            if author_id != user.pk
+        ))
+        self.phase("Подписки", started, len(created))
+
+    def rebuild(self):
+        """Пересчитывает данные, которые bulk_create не обновляет:
+        поисковый индекс, итоги списков покупок, счётчики, ленты и
+        индексы в памяти."""
+        started = time.perf_counter()
+        index_recipes()
+        call_command(
+            "rebuild_shopping_lists", batch_size=self.batch_size,
+            stdout=StringIO(),
+        )
+        call_command("recount_counters", stdout=StringIO())
+        if settings.FEED_STRATEGY == "write":
+            call_command("rebuild_feed", stdout=StringIO())
+        cookable_index.invalidate()
+        ingredient_index.invalidate()
+        self.phase("Производные данные", started, "пересчитаны")
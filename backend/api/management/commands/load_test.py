@@ -0,0 +1,443 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import accumulate
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarks import percentile, zipf_weights
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+SERVERS = {
+    "runserver": (
+        "manage.py", "runserver", "--noreload",
+    ),
+    "wsgi": (
+        "gunicorn", "foodgram.wsgi:application",
+    ),
+    "asgi": (
+        "gunicorn", "foodgram.asgi:application",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+    ),
+}
+
+MIX = {
+    "recipe_list": 25,
+    "recipe_list_tags": 15,
+    "recipe_detail": 15,
+    "ingredient_search": 12,
+    "favorite_toggle": 10,
+    "shopping_cart_toggle": 8,
+    "subscriptions": 8,
+    "download_shopping_cart": 7,
+}
+
+
+class VirtualUser(threading.Thread):
+    """Клиент, который до deadline выполняет сценарии из смеси.
+
+    Замеры до started не записываются: это прогрев.
+    """
+
+    def __init__(self, harness, number, token):
+        super().__init__(daemon=True)
+        self.harness = harness
+        self.rng = random.Random(harness.seed * 100_003 + number)
+        self.session = requests.Session()
+        self.token = token
+        self.samples = []
+
+    def run(self):
+        harness = self.harness
+        while time.monotonic() < harness.deadline:
+            scenario = self.rng.choices(
+                harness.scenarios, cum_weights=harness.cum_weights
+            )[0]
+            getattr(self, scenario)()
+            if harness.think_time:
+                time.sleep(self.rng.expovariate(1 / harness.think_time))
+
+    def request(self, name, method, path, auth=False, **kwargs):
+        headers = {"Authorization": f"Token {self.token}"} if auth else {}
+        start = time.monotonic()
+        try:
+            response = self.session.request(
+                method, self.harness.url + path, headers=headers,
+                timeout=self.harness.timeout, **kwargs,
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        end = time.monotonic()
+        if start >= self.harness.started:
+            self.samples.append((name, status, end, (end - start) * 1000))
+        return status
+
+    def recipe(self):
+        data = self.harness.data
+        return self.rng.choices(
+            data["recipes"], cum_weights=data["recipe_weights"]
+        )[0]
+
+    def recipe_list(self):
+        page = min(int(self.rng.expovariate(0.5)) + 1, 50)
+        self.request("recipe_list", "GET", "/api/recipes/", params={
+            "page": page,
+        })
+
+    def recipe_list_tags(self):
+        slugs = self.harness.data["tags"]
+        self.request("recipe_list_tags", "GET", "/api/recipes/", params={
+            "tags": self.rng.sample(slugs, min(2, len(slugs))),
+        })
+
+    def recipe_detail(self):
+        self.request(
+            "recipe_detail", "GET", f"/api/recipes/{self.recipe()}/"
+        )
+
+    def ingredient_search(self):
+        name = self.rng.choice(self.harness.data["ingredients"])
+        for length in range(1, min(len(name), 4) + 1):
+            self.request(
+                "ingredient_search", "GET", "/api/ingredients/",
+                params={"name": name[:length]},
+            )
+
+    def toggle(self, name, action):
+        path = f"/api/recipes/{self.recipe()}/{action}/"
+        status = self.request(f"{name}_add", "POST", path, auth=True)
+        if status in (201, 400):
+            self.request(f"{name}_remove", "DELETE", path, auth=True)
+
+    def favorite_toggle(self):
+        self.toggle("favorite", "favorite")
+
+    def shopping_cart_toggle(self):
+        self.toggle("shopping_cart", "shopping_cart")
+
+    def subscriptions(self):
+        self.request(
+            "subscriptions", "GET", "/api/users/subscriptions/", auth=True
+        )
+
+    def download_shopping_cart(self):
+        self.request(
+            "download_shopping_cart", "GET",
+            "/api/recipes/download_shopping_cart/", auth=True,
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест: запускает приложение на текущей базе (или "
+        "использует --url), входит пользователями из generate_dataset "
+        "через /api/auth/token/login/ и выполняет взвешенную смесь "
+        "запросов, затем пишет в JSON пропускную способность и "
+        "процентили задержки по каждому запросу"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", help="Адрес уже запущенного приложения"
+        )
+        parser.add_argument(
+            "--server", choices=sorted(SERVERS), default="wsgi",
+            help=(
+                "wsgi и asgi — gunicorn с --workers воркерами, asgi включает "
+                "асинхронные переключатели ASYNC_TOGGLES; runserver — "
+                "сервер разработки без gunicorn"
+            ),
+        )
+        parser.add_argument(
+            "--compare", action="store_true",
+            help=(
+                "Прогнать смесь на wsgi и на asgi подряд и записать оба "
+                "результата и отношение asgi к wsgi по каждому запросу"
+            ),
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--concurrency", type=int, default=32,
+            help="Число одновременных виртуальных пользователей",
+        )
+        parser.add_argument("--duration", type=float, default=60)
+        parser.add_argument("--warmup", type=float, default=5)
+        parser.add_argument(
+            "--think-time", type=float, default=0,
+            help="Средняя пауза между сценариями в секундах",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--prefix", default="user")
+        parser.add_argument("--password", default="foodgram-load")
+        parser.add_argument(
+            "--mix", help="JSON с весами сценариев; дополняет встроенные"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="load_test.json")
+
+    def handle(self, *args, **options):
+        mix = dict(MIX)
+        if options["mix"]:
+            mix.update(json.loads(options["mix"]))
+        unknown = set(mix) - set(MIX)
+        if unknown:
+            raise CommandError(
+                f"Неизвестные сценарии: {', '.join(sorted(unknown))}"
+            )
+        mix = {name: weight for name, weight in mix.items() if weight > 0}
+        self.scenarios = list(mix)
+        self.cum_weights = list(accumulate(mix.values()))
+        self.seed = options["seed"]
+        self.think_time = options["think_time"]
+        self.timeout = options["timeout"]
+        self.data = self.load_data(options)
+        if options["compare"]:
+            if options["url"]:
+                raise CommandError(
+                    "--compare запускает серверы сам, --url с ним не задаётся"
+                )
+            runs = {
+                server: self.measure(server, options, mix)
+                for server in ("wsgi", "asgi")
+            }
+            report = {
+                "runs": runs,
+                "asgi_vs_wsgi": self.compare(runs["wsgi"], runs["asgi"]),
+            }
+        else:
+            report = self.measure(options["server"], options, mix)
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        if options["compare"]:
+            for server, run in report["runs"].items():
+                self.stdout.write(f"{server}:")
+                self.write_report(run)
+            self.write_comparison(report["asgi_vs_wsgi"])
+        else:
+            self.write_report(report)
+        self.stdout.write(f"Результаты записаны в {options['output']}")
+
+    def measure(self, server_name, options, mix):
+        server = None
+        if options["url"]:
+            self.url = options["url"].rstrip("/")
+        else:
+            self.url = f"http://127.0.0.1:{options['port']}"
+            server = self.start_server(server_name, options)
+        try:
+            self.wait_until_ready(server)
+            tokens = self.login(options)
+            report = self.run(tokens, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+        report["config"] = {
+            "server": "external" if options["url"] else server_name,
+            "workers": None if options["url"] else options["workers"],
+            "async_toggles": (
+                None if options["url"] else server_name == "asgi"
+            ),
+            "database": connection.vendor,
+            **{
+                key: options[key]
+                for key in (
+                    "concurrency", "duration", "warmup", "think_time", "seed"
+                )
+            },
+            "mix": mix,
+        }
+        report["started_at"] = self.started_at
+        return report
+
+    def load_data(self, options):
+        recipes = list(
+            Recipe.objects.order_by("?").values_list("id", flat=True)[:10_000]
+        )
+        tags = list(Tag.objects.values_list("slug", flat=True))
+        ingredients = list(Ingredient.objects.values_list("name", flat=True))
+        if not recipes or not tags or not ingredients:
+            raise CommandError(
+                "В базе нет рецептов, тегов или ингредиентов: сначала "
+                "выполните generate_dataset"
+            )
+        return {
+            "recipes": recipes,
+            "recipe_weights": zipf_weights(len(recipes)),
+            "tags": tags,
+            "ingredients": ingredients,
+        }
+
+    def start_server(self, server_name, options):
+        address = f"127.0.0.1:{options['port']}"
+        if server_name == "runserver":
+            command = [sys.executable, *SERVERS["runserver"], address]
+        else:
+            command = [
+                sys.executable, "-m", *SERVERS[server_name],
+                "--bind", address,
+                "--workers", str(options["workers"]),
+                "--log-level", "warning",
+            ]
+        env = {
+            **os.environ,
+            "ASYNC_TOGGLES": "1" if server_name == "asgi" else "",
+            "REQUEST_TIMING_SAMPLE_RATE": os.getenv(
+                "REQUEST_TIMING_SAMPLE_RATE", "0"
+            ),
+        }
+        try:
+            return subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=(
+                    subprocess.DEVNULL if server_name == "runserver"
+                    else None
+                ),
+            )
+        except OSError as error:
+            raise CommandError(f"Не удалось запустить сервер: {error}")
+
+    def wait_until_ready(self, server, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                raise CommandError(
+                    f"Сервер завершился с кодом {server.returncode}"
+                )
+            try:
+                requests.get(f"{self.url}/api/tags/", timeout=5)
+                return
+            except requests.RequestException:
+                time.sleep(0.5)
+        raise CommandError(f"Сервер {self.url} не ответил за {timeout} с")
+
+    def login(self, options):
+        emails = list(
+            User.objects.filter(username__startswith=options["prefix"])
+            .order_by("?").values_list("email", flat=True)
+            [:options["concurrency"]]
+        )
+        if len(emails) < options["concurrency"]:
+            raise CommandError(
+                f"Нужно {options['concurrency']} пользователей с префиксом "
+                f"{options['prefix']!r}, найдено {len(emails)}"
+            )
+        tokens = []
+        with requests.Session() as session:
+            for email in emails:
+                response = session.post(
+                    f"{self.url}/api/auth/token/login/",
+                    json={"email": email, "password": options["password"]},
+                    timeout=self.timeout,
+                )
+                if response.status_code != 200:
+                    raise CommandError(
+                        f"Не удалось войти как {email}: "
+                        f"{response.status_code} {response.text[:200]}"
+                    )
+                tokens.append(response.json()["auth_token"])
+        return tokens
+
+    def run(self, tokens, options):
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.started = time.monotonic() + options["warmup"]
+        self.deadline = self.started + options["duration"]
+        users = [
+            VirtualUser(self, number, token)
+            for number, token in enumerate(tokens)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        finished = max(
+            (end for user in users for _, _, end, _ in user.samples),
+            default=self.deadline,
+        )
+        elapsed = max(finished - self.started, 1e-9)
+        by_name = {}
+        for user in users:
+            for name, status, _, latency in user.samples:
+                by_name.setdefault(name, []).append((status, latency))
+        endpoints = {
+            name: self.summarize(samples, elapsed)
+            for name, samples in sorted(by_name.items())
+        }
+        return {
+            "total": self.summarize(
+                [sample for samples in by_name.values() for sample in samples],
+                elapsed,
+            ),
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def summarize(samples, elapsed):
+        latencies = [latency for _, latency in samples] or [0]
+        statuses = {}
+        for status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "errors": sum(
+                1 for status, _ in samples if status == 0 or status >= 500
+            ),
+            "statuses": statuses,
+            **{
+                f"p{percent}": round(percentile(latencies, percent), 1)
+                for percent in (50, 90, 95, 99)
+            },
+            "max": round(max(latencies), 1),
+            "mean": round(sum(latencies) / len(latencies), 1),
+        }
+
+    def write_report(self, report):
+        for name, result in (
+            *report["endpoints"].items(), ("total", report["total"])
+        ):
+            self.stdout.write(
+                f"{name:>24}: {result['requests']:>7} запросов, "
+                f"{result['rps']:>7.1f}/с, ошибок {result['errors']}, "
+                f"p50 {result['p50']:.1f} мс, p95 {result['p95']:.1f} мс, "
+                f"p99 {result['p99']:.1f} мс"
+            )
+
+    @staticmethod
+    def compare(wsgi, asgi):
+        """Отношение asgi к wsgi по пропускной способности и p95 для
+        запросов, которые были в обоих прогонах."""
+        pairs = {
+            name: (wsgi["endpoints"][name], result)
+            for name, result in asgi["endpoints"].items()
+            if name in wsgi["endpoints"]
+        }
+        pairs["total"] = wsgi["total"], asgi["total"]
+        return {
+            name: {
+                key: (
+                    round(new[key] / old[key], 2) if old[key] else None
+                )
+                for key in ("rps", "p95")
+            }
+            for name, (old, new) in pairs.items()
+        }
+
+    def write_comparison(self, comparison):
+        self.stdout.write("asgi / wsgi:")
+        for name, ratio in comparison.items():
+            self.stdout.write(
+                f"{name:>24}: rps ×{ratio['rps']}, p95 ×{ratio['p95']}"
+            )
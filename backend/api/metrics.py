@@ -0,0 +1,316 @@
+"""Метрики запросов в формате Prometheus.
+
+MetricsMiddleware считает для каждого запроса число ответов по
+обработчику, методу и статусу, гистограмму времени обработки и число
+SQL-запросов. Обработчик записывается как в логе api.timing, например
+RecipeViewSet.list или RecipeViewSet.favorite; поиск ингредиентов по
+имени подписан как IngredientViewSet.search.
+
+Каждый процесс копит метрики в памяти. Если задан METRICS_DIR, процесс
+не реже раза в METRICS_FLUSH_INTERVAL секунд записывает их в файл
+<pid>-<uuid>.json этого каталога, а /api/metrics/ складывает файлы всех
+процессов: так видны все воркеры gunicorn, какой бы из них ни ответил.
+uuid в имени не даёт новому процессу с тем же pid перезаписать файл
+завершившегося. Файлы процессов, которых уже нет, /api/metrics/
+прибавляет к retired.json и удаляет, поэтому счётчики не уменьшаются,
+а каталог не растёт.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+from .timing import view_name
+
+RETIRED = "retired.json"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "foodgram_http_requests_total": (
+        "counter", "Число обработанных запросов"
+    ),
+    "foodgram_http_request_duration_seconds": (
+        "histogram", "Время обработки запроса в секундах"
+    ),
+    "foodgram_db_queries_total": (
+        "counter", "Число SQL-запросов при обработке запросов"
+    ),
+}
+
+
+def escape(value):
+    return (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(labels):
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+def read_snapshot(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(directory, name, snapshot):
+    """Записывает снимок атомарно: читатели видят старый или новый файл."""
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, suffix=".tmp", delete=False
+    ) as file:
+        json.dump(snapshot, file)
+    os.replace(file.name, directory / name)
+
+
+def merge_snapshots(snapshots):
+    """Складывает снимки по имени и меткам."""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = name, tuple(map(tuple, labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot["histograms"]:
+            key = name, tuple(map(tuple, labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+    return counters, histograms
+
+
+def process_exists(path):
+    pid = path.name.split("-", 1)[0]
+    if not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """Счётчики и гистограммы с метками в памяти процесса.
+
+    Метки — кортеж пар (имя, значение). В гистограмме хранится число
+    значений в каждой корзине BUCKETS и сверх последней, затем сумма.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._flushed_at = time.monotonic()
+        self._pid = self._name = None
+
+    @property
+    def file_name(self):
+        """Имя файла процесса; после fork у потомка своё."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._name = f"{self._pid}-{uuid4().hex}.json"
+        return self._name
+
+    def inc(self, name, labels, value=1):
+        key = name, labels
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = name, labels
+        index = bisect_left(BUCKETS, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, labels, list(histogram)]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def maybe_flush(self):
+        if (
+            settings.METRICS_DIR
+            and time.monotonic() - self._flushed_at
+            >= settings.METRICS_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self):
+        """Атомарно записывает метрики процесса в METRICS_DIR."""
+        self._flushed_at = time.monotonic()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        write_snapshot(directory, self.file_name, self.snapshot())
+
+    @staticmethod
+    def retire(directory):
+        """Прибавляет файлы завершившихся процессов к retired.json и
+        удаляет их. Имена прибавленных файлов хранятся в retired.json,
+        чтобы файл, не удалённый из-за сбоя, не учитывался дважды."""
+        with open(directory / "retire.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stale = [
+                path for path in directory.glob("*-*.json")
+                if not process_exists(path)
+            ]
+            if not stale:
+                return
+            retired = read_snapshot(directory / RETIRED) or {
+                "counters": [], "histograms": [], "merged": [],
+            }
+            merged = set(retired["merged"])
+            snapshots = [retired]
+            for path in stale:
+                if path.name not in merged:
+                    snapshot = read_snapshot(path)
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+            counters, histograms = merge_snapshots(snapshots)
+            write_snapshot(directory, RETIRED, {
+                "counters": [
+                    [name, labels, value]
+                    for (name, labels), value in counters.items()
+                ],
+                "histograms": [
+                    [name, labels, values]
+                    for (name, labels), values in histograms.items()
+                ],
+                "merged": [path.name for path in stale],
+            })
+            for path in stale:
+                path.unlink(missing_ok=True)
+
+    def collect(self):
+        """Метрики всех процессов, сложенные по имени и меткам."""
+        if not settings.METRICS_DIR:
+            return merge_snapshots([self.snapshot()])
+        self.flush()
+        directory = Path(settings.METRICS_DIR)
+        self.retire(directory)
+        retired = read_snapshot(directory / RETIRED)
+        merged = set(retired["merged"]) if retired else set()
+        snapshots = [retired] if retired else []
+        for path in directory.glob("*-*.json"):
+            if path.name not in merged:
+                snapshot = read_snapshot(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return merge_snapshots(snapshots)
+
+    def render(self):
+        """Текст в формате Prometheus 0.0.4."""
+        counters, histograms = self.collect()
+        lines = []
+        for metric, (kind, description) in METRICS.items():
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            if kind == "counter":
+                for (name, labels), value in sorted(counters.items()):
+                    if name == metric:
+                        lines.append(
+                            f"{metric}{{{format_labels(labels)}}} {value}"
+                        )
+                continue
+            for (name, labels), values in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), values):
+                    cumulative += count
+                    bucket_labels = format_labels(labels + (("le", bound),))
+                    lines.append(
+                        f"{metric}_bucket{{{bucket_labels}}} {cumulative}"
+                    )
+                lines.append(
+                    f"{metric}_sum{{{format_labels(labels)}}} {values[-1]}"
+                )
+                lines.append(
+                    f"{metric}_count{{{format_labels(labels)}}} {cumulative}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def wrap(self, stack):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started, queries = time.perf_counter(), QueryCounter()
+        with ExitStack() as stack:
+            queries.wrap(stack)
+            response = self.get_response(request)
+        self.record(request, response, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        started, queries = time.perf_counter(), QueryCounter()
+        with ExitStack() as stack:
+            queries.wrap(stack)
+            response = await self.get_response(request)
+        self.record(request, response, started, queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = view_name(view_func, request.method)
+
+    @staticmethod
+    def record(request, response, started, queries):
+        view = getattr(request, "view_name", None) or "unmatched"
+        method = request.method
+        registry.inc("foodgram_http_requests_total", (
+            ("view", view), ("method", method),
+            ("status", str(response.status_code)),
+        ))
+        registry.observe(
+            "foodgram_http_request_duration_seconds",
+            (("view", view), ("method", method)),
+            time.perf_counter() - started,
+        )
+        if queries.count:
+            registry.inc(
+                "foodgram_db_queries_total", (("view", view),), queries.count
+            )
+        registry.maybe_flush()
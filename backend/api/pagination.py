@@ -1,7 +1,127 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
     max_page_size = 24
+
+
+class KeysetPagination(CursorPagination):
+    """Постраничный вывод по курсору на паре (pub_date, id).
+
+    Страница выбирается условием по позиции последней записи вместо
+    OFFSET и не требует COUNT(*), поэтому глубокие страницы не дороже
+    первой. Порядок совпадает с Recipe.Meta.ordering.
+
+    Поля позиции задаются date_field и id_field: по умолчанию это поля
+    рецепта, но можно указать аннотации с теми же значениями, чтобы
+    сортировка шла по индексу другой таблицы.
+    """
+
+    page_size = CustomPagination.page_size
+    page_size_query_param = CustomPagination.page_size_query_param
+    max_page_size = CustomPagination.max_page_size
+    date_field = "pub_date"
+    id_field = "id"
+
+    @property
+    def ordering(self):
+        return f"-{self.date_field}", f"-{self.id_field}"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by(self.date_field, self.id_field)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            lookup = "gt" if reverse else "lt"
+            queryset = queryset.filter(
+                Q(**{f"{self.date_field}__{lookup}": pub_date})
+                | Q(**{
+                    self.date_field: pub_date,
+                    f"{self.id_field}__{lookup}": pk,
+                })
+            )
+        page = list(queryset[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = page
+        return page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            direction, pub_date, pk = (
+                b64decode(encoded.encode("ascii")).decode("ascii").split("|")
+            )
+            return (datetime.fromisoformat(pub_date), int(pk)), direction == "r"
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse):
+        direction = "r" if reverse else "n"
+        pub_date = getattr(recipe, self.date_field)
+        pk = getattr(recipe, self.id_field)
+        cursor = f"{direction}|{pub_date.isoformat()}|{pk}"
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            b64encode(cursor.encode("ascii")).decode("ascii"),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class FeedPagination(KeysetPagination):
+    """Курсор по дате и рецепту записи ленты, чтобы выборка шла по
+    индексу (user, pub_date, recipe) таблицы лент."""
+
+    date_field = "feed_pub_date"
+    id_field = "feed_recipe"
+
+
+class RecipePagination(CustomPagination):
+    """Номера страниц по умолчанию и курсор при наличии ?cursor=."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,15 +1,122 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator
 from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
+from recipes.images import (content_hash, schedule_variants, store_image,
+                            uploaded_hash, variant_names)
 from recipes.models import (Ingredient, IngredientAmount, Recipe, ShoppingCart,
-                            Tag)
+                            ShoppingListItem, Tag)
+from recipes.signals import shopping_lists_updated_by_caller
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from users.models import Follow
 from users.serializers import CustomUserSerializer
 
-
-class TagSerializer(serializers.ModelSerializer):
+from .cache import cache_timeout, recipe_cache_keys
+from .timing import TimedListSerializer, TimedSerializerMixin
+
+
+class HashedBase64ImageField(Base64ImageField):
+    """Называет загруженную картинку хешем её содержимого."""
+
+    def get_file_name(self, decoded_file):
+        return content_hash(decoded_file)
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, объекты которого загружаются одним
+    запросом IN."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) and hasattr(data, "__iter__"):
+            self.child_relation.prefetch(data)
+        return super().to_internal_value(data)
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, объект которого берётся из загруженных заранее.
+
+    prefetch(values) загружает объекты для всех значений одним запросом
+    IN, после чего to_internal_value не обращается к базе. Ошибки те же,
+    что у PrimaryKeyRelatedField. Со списком (many=True) и внутри
+    BatchedListSerializer загрузка выполняется сама.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.loaded = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def prefetch(self, values):
+        pks = set()
+        for value in values:
+            try:
+                if self.pk_field is not None:
+                    value = self.pk_field.to_internal_value(value)
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, DjangoValidationError,
+                    serializers.ValidationError):
+                continue
+        self.loaded = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.loaded is None:
+            return super().to_internal_value(data)
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in self.loaded:
+            self.fail("does_not_exist", pk_value=data)
+        return self.loaded[pk]
+
+
+class BatchedListSerializer(serializers.ListSerializer):
+    """Список вложенных объектов, в котором поля
+    BatchedPrimaryKeyRelatedField всех элементов загружают объекты одним
+    запросом на поле."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            for name, field in self.child.fields.items():
+                if isinstance(field, BatchedPrimaryKeyRelatedField):
+                    field.prefetch(
+                        item[name] for item in data
+                        if isinstance(item, dict) and name in item
+                    )
+        return super().to_internal_value(data)
+
+
+def image_variant_urls(recipe, request=None, names=None):
+    urls = {}
+    for variant, name in (names or recipe.image_variants).items():
+        url = default_storage.url(name)
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
+        list_serializer_class = TimedListSerializer
         fields = (
             "id",
             "name",
@@ -18,10 +125,11 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ("id", "name", "measurement_unit")
+        list_serializer_class = TimedListSerializer
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
@@ -37,34 +145,125 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
-class RecipesSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        if self.context.get("public"):
+            return super().to_representation(data)
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.personalize_many(list(recipes))
+
+
+class RecipesSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Рецепт для чтения.
+
+    Общая для всех часть представления кешируется по рецепту, а поля,
+    зависящие от пользователя, подставляются при каждом запросе из
+    аннотаций is_favorited, is_in_shopping_cart и author_is_subscribed.
+    Счётчики тоже берутся из самой строки рецепта: они меняются без
+    сброса кеша.
+    """
+
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
     text = serializers.CharField(trim_whitespace=False)
     cooking_time = serializers.IntegerField(validators=[MinValueValidator(1)])
     ingredients = serializers.SerializerMethodField(read_only=True)
 
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj)
+
     def get_ingredients(self, obj):
-        ingredients = IngredientAmount.objects.filter(recipe=obj)
+        ingredients = obj.ingredient_amount.all()
         return IngredientAmountSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         return obj.favorites.filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         return obj.shopping_cart.filter(user=request.user).exists()
 
+    def get_author_is_subscribed(self, obj):
+        request = self.context.get("request")
+        if not request or request.user.is_anonymous:
+            return False
+        if hasattr(obj, "author_is_subscribed"):
+            return obj.author_is_subscribed
+        return Follow.objects.filter(
+            user=request.user, author_id=obj.author_id
+        ).exists()
+
+    def to_representation(self, instance):
+        if self.context.get("public"):
+            return super().to_representation(instance)
+        return self.personalize_many([instance])[0]
+
+    def personalize_many(self, recipes):
+        keys = recipe_cache_keys(recipe.pk for recipe in recipes)
+        cached = cache.get_many(keys.values())
+        public = {pk: cached[key] for pk, key in keys.items() if key in cached}
+        missing = [recipe for recipe in recipes if recipe.pk not in public]
+        if missing:
+            prefetch_related_objects(
+                missing,
+                "author",
+                "tags",
+                Prefetch(
+                    "ingredient_amount",
+                    queryset=IngredientAmount.objects.select_related(
+                        "ingredient"
+                    ),
+                ),
+            )
+            data = RecipesSerializer(
+                missing, many=True, context={"public": True}
+            ).data
+            for recipe, representation in zip(missing, data):
+                public[recipe.pk] = representation
+            cache.set_many(
+                {keys[recipe.pk]: public[recipe.pk] for recipe in missing},
+                cache_timeout(settings.RECIPE_CACHE_TIMEOUT),
+            )
+        return [
+            self.personalize(public[recipe.pk], recipe) for recipe in recipes
+        ]
+
+    def personalize(self, public, instance):
+        data = public.copy()
+        data["author"] = data["author"].copy()
+        data["author"]["is_subscribed"] = self.get_author_is_subscribed(
+            instance
+        )
+        data["is_favorited"] = self.get_is_favorited(instance)
+        data["is_in_shopping_cart"] = self.get_is_in_shopping_cart(instance)
+        data["favorites_count"] = instance.favorites_count
+        data["shopping_cart_count"] = instance.shopping_cart_count
+        request = self.context.get("request")
+        if request is not None:
+            if data["image"]:
+                data["image"] = request.build_absolute_uri(data["image"])
+            data["image_variants"] = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in data["image_variants"].items()
+            }
+        return data
+
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = (
             "id",
             "tags",
@@ -72,38 +271,38 @@ class RecipesSerializer(serializers.ModelSerializer):
             "ingredients",
             "is_favorited",
             "is_in_shopping_cart",
+            "favorites_count",
+            "shopping_cart_count",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         )
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BatchedPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField()
 
     class Meta:
         model = IngredientAmount
         fields = ('id', 'amount')
+        list_serializer_class = BatchedListSerializer
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     ingredients = AddIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BatchedPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all(),
         error_messages={'does_not_exist': 'Указанного тега не существует'}
     )
-    image = Base64ImageField()
+    image = HashedBase64ImageField()
     author = CustomUserSerializer(read_only=True)
     cooking_time = serializers.IntegerField()
 
-    def validate_tags(self, tags):
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError("Такого тега не существует")
-        return tags
-
     def validate_cooking_time(self, cooking_time):
         if cooking_time < 1:
             raise serializers.ValidationError(
@@ -114,17 +313,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError("Ингредиенты отсутствуют")
-        ingredients_list = []
+        seen = set()
         for ingredient in ingredients:
             ingredient_id = ingredient.get('id')
             if ingredient.get("amount") < 1:
                 raise serializers.ValidationError(
                     "Количество ингредиента должно быть не менее одного"
                 )
-            if ingredient_id in ingredients_list:
+            if ingredient_id in seen:
                 raise serializers.ValidationError(
                     "Ингредиенты не могут повторяться")
-            ingredients_list.append(ingredient_id)
+            seen.add(ingredient_id)
         return ingredients
 
     def __create_ingredients(self, recipe, ingredients):
@@ -149,25 +348,103 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Такой рецепт уже существует")
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
-        recipe = Recipe.objects.create(**validated_data)
+        image = validated_data.pop("image")
+        recipe = Recipe.objects.create(
+            image=store_image(image),
+            image_hash=uploaded_hash(image),
+            **validated_data,
+        )
         recipe.tags.set(tags)
         self.__create_ingredients(recipe, ingredients)
+        schedule_variants(recipe)
         return recipe
 
+    @staticmethod
+    def __update_tags(recipe, tags):
+        """Удаляет и добавляет только изменившиеся связи с тегами.
+
+        Сигналы m2m_changed при этом не отправляются: кеши рецепта
+        сбрасывает последующее сохранение рецепта.
+        """
+        Through = Recipe.tags.through
+        old = set(
+            Through.objects.filter(recipe=recipe)
+            .values_list("tag_id", flat=True)
+        )
+        new = {tag.pk for tag in tags}
+        if old - new:
+            Through.objects.filter(
+                recipe=recipe, tag_id__in=old - new
+            ).delete()
+        Through.objects.bulk_create(
+            Through(recipe=recipe, tag_id=tag_id) for tag_id in new - old
+        )
+
+    @staticmethod
+    def __update_ingredients(recipe, ingredients):
+        """Добавляет, меняет и удаляет только изменившиеся количества
+        ингредиентов и возвращает разницу {ingredient_id: amount} для
+        списков покупок. bulk_create и bulk_update сигналов не
+        отправляют, а удаление идёт без пересчёта списков в pre_delete,
+        поэтому разница учитывает все три вида изменений."""
+        old = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmount.objects.filter(recipe=recipe)
+        }
+        to_create, to_update, delta = [], [], {}
+        for ingredient_data in ingredients:
+            ingredient_id = ingredient_data["id"].pk
+            amount = ingredient_data["amount"]
+            current = old.pop(ingredient_id, None)
+            if current is None:
+                to_create.append(IngredientAmount(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+                delta[ingredient_id] = amount
+            elif current.amount != amount:
+                delta[ingredient_id] = amount - current.amount
+                current.amount = amount
+                to_update.append(current)
+        IngredientAmount.objects.bulk_create(to_create)
+        IngredientAmount.objects.bulk_update(to_update, ("amount",))
+        if old:
+            for ingredient_id, current in old.items():
+                delta[ingredient_id] = -current.amount
+            with shopping_lists_updated_by_caller():
+                IngredientAmount.objects.filter(
+                    pk__in=[current.pk for current in old.values()]
+                ).delete()
+        return delta
+
     @transaction.atomic
     def update(self, instance, validated_data):
         if "tags" in validated_data:
-            instance.tags.set(validated_data.pop("tags"))
+            self.__update_tags(instance, validated_data.pop("tags"))
         if "ingredients" in validated_data:
-            ingredients = validated_data.pop("ingredients")
-            instance.ingredients.clear()
-            self.__create_ingredients(instance, ingredients)
+            delta = self.__update_ingredients(
+                instance, validated_data.pop("ingredients")
+            )
+            ShoppingListItem.objects.apply_delta(
+                instance.shopping_cart.values_list("user_id", flat=True), delta
+            )
+        image = validated_data.pop("image", None)
+        if image is not None and uploaded_hash(image) != instance.image_hash:
+            instance.image = store_image(image)
+            instance.image_hash = uploaded_hash(image)
+            instance.image_variants = {}
+            schedule_variants(instance)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        return RecipesSerializer(
-            instance, context={"request": self.context.get("request")}
-        ).data
+        """Варианты новой картинки строятся после ответа, поэтому пока
+        их нет, в ответе адреса, по которым они появятся."""
+        request = self.context.get("request")
+        data = RecipesSerializer(instance, context={"request": request}).data
+        if not data["image_variants"] and instance.image_hash:
+            data["image_variants"] = image_variant_urls(
+                instance, request, variant_names(instance.image_hash)
+            )
+        return data
 
     class Meta:
         model = Recipe
@@ -183,7 +460,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj, self.context.get("request"))
+
     def validate(self, data):
         user = data.get('user')
         obj = user.favorites.filter(recipe=data.get('recipe'))
@@ -196,10 +478,10 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     def validate(self, data):
         user = data.get('user')
         obj = user.shopping_cart.filter(recipe=data.get('recipe'))
@@ -219,3 +501,30 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ("user", "recipe")
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_MAX_SIZE,
+        error_messages={
+            "max_length": "Не больше {max_length} рецептов за один запрос"
+        },
+    )
+
+
+class CookableRecipeSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Рецепт из подбора по имеющимся ингредиентам."""
+
+    recipe = FavoriteSerializer()
+    matched = serializers.IntegerField()
+    total = serializers.IntegerField()
+    coverage = serializers.SerializerMethodField()
+    missing = IngredientAmountSerializer(many=True)
+
+    def get_coverage(self, obj):
+        return round(obj["matched"] / obj["total"], 3)
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
@@ -0,0 +1,144 @@
+import csv
+import hashlib
+import io
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def shopping_list_rows(user):
+    return user.shopping_list.values_list(
+        "ingredient__name", "ingredient__measurement_unit", "amount"
+    ).order_by("ingredient__name").iterator(chunk_size=500)
+
+
+def shopping_list_digest(user):
+    """Отпечаток содержимого файла: меняется вместе с итогами, а также
+    названиями и единицами измерения ингредиентов."""
+    digest = hashlib.sha256(str(user).encode())
+    for row in user.shopping_list.values_list(
+        "ingredient_id", "ingredient__name", "ingredient__measurement_unit",
+        "amount",
+    ).order_by("ingredient_id").iterator(chunk_size=2000):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def render_txt(user, rows):
+    yield f"Список покупок пользователя: {user}".encode()
+    for name, measurement_unit, amount in rows:
+        yield f"\n- {name} - {amount} {measurement_unit}".encode()
+
+
+def render_csv(user, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(("Ингредиент", "Количество", "Единица измерения"))
+    for name, measurement_unit, amount in rows:
+        writer.writerow((name, amount, measurement_unit))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def pdf_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    path = settings.SHOPPING_LIST_PDF_FONT
+    if not os.path.exists(path):
+        return "Helvetica"
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(name, path))
+    return name
+
+
+def render_pdf(user, rows):
+    """В отличие от txt и csv, PDF не потоковый: reportlab держит все
+    страницы в памяти до canvas.save(), поэтому память растёт с длиной
+    списка, а отдавать файл частями можно только после сборки."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen.canvas import Canvas
+
+    font = pdf_font()
+    width, height = A4
+    with SpooledTemporaryFile(max_size=1024 * 1024) as file:
+        canvas = Canvas(file, pagesize=A4)
+        canvas.setTitle("Список покупок")
+        canvas.setFont(font, 14)
+        y = height - 20 * mm
+        canvas.drawString(20 * mm, y, f"Список покупок пользователя: {user}")
+        canvas.setFont(font, 11)
+        y -= 10 * mm
+        for name, measurement_unit, amount in rows:
+            if y < 20 * mm:
+                canvas.showPage()
+                canvas.setFont(font, 11)
+                y = height - 20 * mm
+            canvas.drawString(
+                20 * mm, y, f"- {name} - {amount} {measurement_unit}"
+            )
+            y -= 7 * mm
+        canvas.save()
+        file.seek(0)
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+FORMATS = {
+    "txt": ("text/plain; charset=utf-8", render_txt),
+    "csv": ("text/csv; charset=utf-8", render_csv),
+    "pdf": ("application/pdf", render_pdf),
+}
+
+
+def cache_stream(key, chunks):
+    """Отдаёт части файла и кеширует его целиком, если он не слишком
+    велик."""
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                parts = None
+        yield chunk
+    if parts is not None:
+        cache.set(
+            key, b"".join(parts), settings.SHOPPING_LIST_CACHE_TIMEOUT
+        )
+
+
+def shopping_list_response(user, file_format, streaming=True):
+    """streaming=False собирает файл до возврата ответа: ASGIHandler в
+    Django 4.1 читает потоковый ответ в цикле событий, где запросы к базе
+    запрещены."""
+    content_type, render = FORMATS[file_format]
+    key = (
+        f"shopping_list:{user.pk}:{file_format}:"
+        f"{shopping_list_digest(user)}"
+    )
+    content = cache.get(key)
+    if content is None and not streaming:
+        content = b"".join(
+            cache_stream(key, render(user, shopping_list_rows(user)))
+        )
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            cache_stream(key, render(user, shopping_list_rows(user))),
+            content_type=content_type,
+        )
+    filename = f"shopping_list.{file_format}"
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
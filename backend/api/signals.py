@@ -0,0 +1,91 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.signals import ingredients_loaded
+from users.models import User
+
+from .authentication import token_cache
+from .cache import bump_model_version, invalidate_recipes
+from .cookable_index import cookable_index
+from .ingredient_index import ingredient_index
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tag_version(**kwargs):
+    bump_model_version(Tag)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(ingredients_loaded)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def invalidate_ingredient_amount(instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def refresh_cookable_recipe(instance, update_fields=None, **kwargs):
+    if not update_fields:
+        cookable_index.on_commit(cookable_index.refresh_recipe, instance.pk)
+
+
+@receiver(post_save, sender=IngredientAmount)
+def add_cookable_ingredient(instance, **kwargs):
+    cookable_index.on_commit(
+        cookable_index.add, instance.recipe_id, instance.ingredient_id
+    )
+
+
+@receiver(post_delete, sender=IngredientAmount)
+def discard_cookable_ingredient(instance, **kwargs):
+    cookable_index.on_commit(
+        cookable_index.discard, instance.recipe_id, instance.ingredient_id
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_relations(instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            invalidate_recipes([instance.pk])
+    elif action == "pre_clear":
+        invalidate_recipes(instance.recipes.values_list("pk", flat=True))
+    elif action.startswith("post_") and pk_set:
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_recipes(instance.recipes.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    token_cache.delete([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, update_fields, **kwargs):
+    if created or update_fields and set(update_fields) <= {"last_login"}:
+        return
+    token_cache.delete(
+        Token.objects.filter(user=instance).values_list("key", flat=True)
+    )
@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from recipes.models import Ingredient, IngredientAmount, Recipe
+from users.models import User
+
+from api.cookable_index import CookableIndex
+
+
+@override_settings(COOKABLE_INDEX_CHECK_INTERVAL=0)
+@mock.patch("api.cookable_index.cache_is_shared", return_value=True)
+class CookableIndexSyncTest(TestCase):
+    """Процессы подтягивают чужие изменения по журналу, не строя индекс
+    заново."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username="author", email="author@example.org"
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"ингредиент {i}",
+                                      measurement_unit="г")
+            for i in range(3)
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=author,
+            name="Рецепт",
+            text="Описание",
+            image="recipes/test.png",
+            cooking_time=10,
+        )
+        IngredientAmount.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredients[0], amount=1
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.writer, self.reader = CookableIndex(), CookableIndex()
+        for index in (self.writer, self.reader):
+            index.search([], 1)
+
+    def search(self, index, ingredient):
+        return [row[0] for row in index.search([ingredient.pk], 10)]
+
+    def test_reader_applies_changes(self, cache_is_shared):
+        IngredientAmount.objects.create(
+            recipe=self.recipe, ingredient=self.ingredients[1], amount=1
+        )
+        self.writer.refresh_recipe(self.recipe.pk)
+        self.assertEqual(
+            self.search(self.writer, self.ingredients[1]), [self.recipe.pk]
+        )
+        with mock.patch.object(
+            self.reader, "_build", wraps=self.reader._build
+        ) as build:
+            self.assertEqual(
+                self.search(self.reader, self.ingredients[1]),
+                [self.recipe.pk],
+            )
+        build.assert_not_called()
+
+    def test_invalidate_rebuilds(self, cache_is_shared):
+        IngredientAmount.objects.create(
+            recipe=self.recipe, ingredient=self.ingredients[2], amount=1
+        )
+        self.writer.invalidate()
+        with mock.patch.object(
+            self.reader, "_build", wraps=self.reader._build
+        ) as build:
+            self.assertEqual(
+                self.search(self.reader, self.ingredients[2]),
+                [self.recipe.pk],
+            )
+        build.assert_called_once()
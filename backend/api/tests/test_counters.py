@@ -0,0 +1,40 @@
+from django.test import TestCase
+from recipes.models import Recipe
+from users.models import User
+
+
+class RecipesCountTest(TestCase):
+    """recipes_count следует за автором рецепта при его смене."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first, cls.second = (
+            User.objects.create_user(
+                username=f"author{i}", email=f"author{i}@example.org"
+            )
+            for i in range(2)
+        )
+
+    def counts(self):
+        return [
+            User.objects.get(pk=user.pk).recipes_count
+            for user in (self.first, self.second)
+        ]
+
+    def test_author_change_moves_count(self):
+        recipe = Recipe.objects.create(
+            author=self.first,
+            name="Рецепт",
+            text="Описание",
+            image="recipes/test.png",
+            cooking_time=10,
+        )
+        self.assertEqual(self.counts(), [1, 0])
+        recipe.author = self.second
+        recipe.save()
+        self.assertEqual(self.counts(), [0, 1])
+        recipe.name = "Другой рецепт"
+        recipe.save(update_fields=("name",))
+        self.assertEqual(self.counts(), [0, 1])
+        recipe.delete()
+        self.assertEqual(self.counts(), [0, 0])
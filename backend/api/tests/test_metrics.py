@@ -0,0 +1,59 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from api.metrics import RETIRED, MetricsRegistry
+
+COUNTER = "foodgram_http_requests_total"
+LABELS = (("view", "TagViewSet.list"), ("method", "GET"), ("status", "200"))
+
+
+class MetricsFilesTest(SimpleTestCase):
+    """Файлы завершившихся процессов переносятся в retired.json без
+    потери счётчиков."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write_dead_process(self, name, value):
+        (self.directory / name).write_text(json.dumps({
+            "counters": [[COUNTER, LABELS, value]],
+            "histograms": [],
+        }))
+
+    def total(self, registry):
+        counters, _ = registry.collect()
+        return counters.get((COUNTER, LABELS), 0)
+
+    def test_dead_process_files_are_retired(self):
+        registry = MetricsRegistry()
+        registry.inc(COUNTER, LABELS)
+        # pid больше предельного pid_max: такого процесса нет.
+        self.write_dead_process("99999999-old.json", 5)
+        self.assertEqual(self.total(registry), 6)
+        self.assertFalse((self.directory / "99999999-old.json").exists())
+        self.assertTrue((self.directory / RETIRED).exists())
+        self.write_dead_process("99999998-old.json", 2)
+        self.assertEqual(self.total(registry), 8)
+        self.assertEqual(self.total(registry), 8)
+        self.assertEqual(
+            [path.name for path in self.directory.glob("*-*.json")],
+            [registry.file_name],
+        )
+
+    def test_leftover_merged_file_is_not_counted_twice(self):
+        registry = MetricsRegistry()
+        self.write_dead_process("99999999-old.json", 5)
+        self.assertEqual(self.total(registry), 5)
+        self.write_dead_process("99999999-old.json", 5)
+        retired = json.loads((self.directory / RETIRED).read_text())
+        retired["merged"].append("99999999-old.json")
+        (self.directory / RETIRED).write_text(json.dumps(retired))
+        self.assertEqual(self.total(registry), 5)
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag)
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.org"
+        )
+        cls.viewer = User.objects.create_user(
+            username="viewer", email="viewer@example.org"
+        )
+        tags = [
+            Tag.objects.create(name=f"tag{i}", slug=f"tag-{i}")
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f"ингредиент {i}",
+                                      measurement_unit="г")
+            for i in range(4)
+        ]
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f"Рецепт {number}",
+                text="Описание",
+                image="recipes/test.png",
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:number % 3 + 1])
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[:number % 4 + 1]
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.viewer, recipe=recipe)
+            if number % 3 == 0:
+                ShoppingCart.objects.create(user=cls.viewer, recipe=recipe)
+        Follow.objects.create(user=cls.viewer, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_list(self, client, limit):
+        response = client.get("/api/recipes/", {"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), limit)
+        return response
+
+    def assert_constant_queries(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_list(client, 1)
+        expected = len(queries)
+        for limit in (5, 12):
+            cache.clear()
+            with self.assertNumQueries(expected):
+                self.get_list(client, limit)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        self.assert_constant_queries(client)
+        results = self.get_list(client, 12).json()["results"]
+        self.assertEqual(
+            sum(recipe["is_favorited"] for recipe in results), 6
+        )
+        self.assertEqual(
+            sum(recipe["is_in_shopping_cart"] for recipe in results), 4
+        )
+        self.assertTrue(
+            all(recipe["author"]["is_subscribed"] for recipe in results)
+        )
+
+    def test_cached_representations(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        self.get_list(client, 12)
+        with CaptureQueriesContext(connection) as cold:
+            cache.clear()
+            self.get_list(client, 12)
+        with CaptureQueriesContext(connection) as warm:
+            self.get_list(client, 12)
+        self.assertLess(len(warm), len(cold))
+
+    def test_tags_filter_ignores_empty_values(self):
+        client = APIClient()
+        for query, count in (
+            ("tags=tag-2", 4),
+            ("tags=tag-2&tags=", 4),
+            ("tags=&tags=tag-2", 4),
+            ("tags=tag-1&tags=tag-2", 8),
+            ("tags=", 12),
+        ):
+            with self.subTest(query=query):
+                response = client.get(f"/api/recipes/?{query}")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["count"], count)
@@ -0,0 +1,84 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, IngredientAmount, Recipe
+from rest_framework.test import APIClient
+from users.models import User
+
+
+class RecipeUpdateIngredientsTest(TestCase):
+    """PATCH рецепта пишет только изменившиеся количества ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.org"
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"ингредиент {i}",
+                                      measurement_unit="г")
+            for i in range(5)
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name="Рецепт",
+            text="Описание",
+            image="recipes/test.png",
+            cooking_time=10,
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=cls.recipe, ingredient=ingredient, amount=10
+            )
+            for ingredient in cls.ingredients[:4]
+        )
+
+    def count_statements(self, queries, statement):
+        table = IngredientAmount._meta.db_table
+        return sum(
+            1 for query in queries
+            if query["sql"].startswith(statement)
+            and f'"{table}"' in query["sql"].split("WHERE")[0]
+        )
+
+    def test_patch_writes_only_changes(self):
+        unchanged = {
+            amount.ingredient_id: amount.pk
+            for amount in IngredientAmount.objects.filter(
+                recipe=self.recipe, ingredient__in=self.ingredients[:2]
+            )
+        }
+        client = APIClient()
+        client.force_authenticate(self.author)
+        ingredients = [
+            {"id": self.ingredients[0].pk, "amount": 10},
+            {"id": self.ingredients[1].pk, "amount": 10},
+            {"id": self.ingredients[2].pk, "amount": 25},
+            {"id": self.ingredients[4].pk, "amount": 5},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = client.patch(
+                f"/api/recipes/{self.recipe.pk}/",
+                {"ingredients": ingredients},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.count_statements(context, "INSERT"), 1)
+        self.assertEqual(self.count_statements(context, "UPDATE"), 1)
+        self.assertEqual(self.count_statements(context, "DELETE"), 1)
+        amounts = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmount.objects.filter(recipe=self.recipe)
+        }
+        self.assertEqual(
+            {ingredient_id: amount.amount
+             for ingredient_id, amount in amounts.items()},
+            {
+                self.ingredients[0].pk: 10,
+                self.ingredients[1].pk: 10,
+                self.ingredients[2].pk: 25,
+                self.ingredients[4].pk: 5,
+            },
+        )
+        for ingredient_id, pk in unchanged.items():
+            self.assertEqual(amounts[ingredient_id].pk, pk)
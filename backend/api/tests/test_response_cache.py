@@ -0,0 +1,83 @@
+import warnings
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import TestCase
+from recipes.models import Ingredient, Tag
+from rest_framework.test import APIClient
+
+from api.cache import model_version
+
+
+class ResponseCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name="завтрак", slug="breakfast")
+        Ingredient.objects.create(name="сахар", measurement_unit="г")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_etag_and_headers(self):
+        response = self.client.get("/api/tags/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Accept", response["Vary"])
+        cached = self.client.get("/api/tags/")
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["ETag"], response["ETag"])
+        self.assertIn("Accept", cached["Vary"])
+        self.assertIn("GET", cached["Allow"])
+        not_modified = self.client.get(
+            "/api/tags/", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        self.assertIn("Accept", not_modified["Vary"])
+
+    def test_media_type_in_key(self):
+        plain = self.client.get("/api/tags/")
+        indented = self.client.get(
+            "/api/tags/", HTTP_ACCEPT="application/json; indent=4"
+        )
+        self.assertNotEqual(plain.content, indented.content)
+        self.assertEqual(
+            self.client.get("/api/tags/").content, plain.content
+        )
+
+    def test_key_is_safe_for_odd_urls(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            response = self.client.get(
+                "/api/tags/?junk=" + "ы %20" * 200,
+                HTTP_ACCEPT="application/json; indent=4",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.get("/api/tags/?other=1")["ETag"],
+            self.client.get("/api/tags/")["ETag"],
+        )
+        responses = [key for key in cache._cache if ":response:" in key]
+        self.assertEqual(len(responses), 2)
+        self.assertTrue(all(len(key) < 250 for key in responses))
+
+    def test_ingredient_search_not_modified(self):
+        response = self.client.get("/api/ingredients/", {"name": "са"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        self.assertIn("max-age", response["Cache-Control"])
+        not_modified = self.client.get(
+            "/api/ingredients/", {"name": "са"},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        other = self.client.get("/api/ingredients/", {"name": "со"})
+        self.assertNotEqual(other["ETag"], response["ETag"])
+
+    def test_version_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Tag.objects.create(name="обед", slug="lunch")
+            version = model_version(Tag)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(model_version(Tag), version)
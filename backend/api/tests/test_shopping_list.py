@@ -0,0 +1,108 @@
+from django.test import AsyncClient, TestCase
+from recipes.models import (Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingListItem,
+                            shopping_list_totals)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+
+class ShoppingListTotalsTest(TestCase):
+    """Итоги списков покупок остаются верными при изменениях через API и
+    в обход него, например из админки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.org"
+        )
+        cls.buyers = [
+            User.objects.create_user(
+                username=f"buyer{i}", email=f"buyer{i}@example.org"
+            )
+            for i in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"ингредиент {i}",
+                                      measurement_unit="г")
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f"Рецепт {number}",
+                text="Описание",
+                image="recipes/test.png",
+                cooking_time=10,
+            )
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=10 * (i + 1)
+                )
+                for i, ingredient in enumerate(self.ingredients[:2])
+            )
+            for buyer in self.buyers:
+                ShoppingCart.objects.create(user=buyer, recipe=recipe)
+                ShoppingListItem.objects.add_recipe(recipe, [buyer.pk])
+            self.recipes.append(recipe)
+
+    def assert_totals(self):
+        expected = {
+            (row["recipe__shopping_cart__user"], row["ingredient"]):
+                row["total"]
+            for row in shopping_list_totals()
+        }
+        actual = {
+            (item.user_id, item.ingredient_id): item.amount
+            for item in ShoppingListItem.objects.all()
+        }
+        self.assertEqual(actual, expected)
+
+    def test_recipe_delete(self):
+        self.recipes[0].delete()
+        self.assert_totals()
+        self.recipes[1].delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_ingredient_amount_changes(self):
+        recipe = self.recipes[0]
+        amount = recipe.ingredient_amount.get(ingredient=self.ingredients[0])
+        amount.amount = 3
+        amount.save()
+        self.assert_totals()
+        amount.ingredient = self.ingredients[2]
+        amount.save()
+        self.assert_totals()
+        IngredientAmount.objects.create(
+            recipe=recipe, ingredient=self.ingredients[0], amount=7
+        )
+        self.assert_totals()
+        amount.delete()
+        self.assert_totals()
+
+    def test_recipe_patch(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f"/api/recipes/{self.recipes[0].pk}/",
+            {"ingredients": [
+                {"id": self.ingredients[1].pk, "amount": 4},
+                {"id": self.ingredients[2].pk, "amount": 6},
+            ]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_totals()
+
+    async def test_asgi_download_is_not_streamed(self):
+        token = await Token.objects.acreate(user=self.buyers[0])
+        response = await AsyncClient().get(
+            "/api/recipes/download_shopping_cart/",
+            AUTHORIZATION=f"Token {token.key}",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertIn("ингредиент 0 - 20 г", response.content.decode())
@@ -0,0 +1,207 @@
+"""Замер времени обработки запросов.
+
+RequestTimingMiddleware для выбранной доли запросов
+(REQUEST_TIMING_SAMPLE_RATE) считает число SQL-запросов и время в базе,
+сериализации и отрисовке ответа. Результат отдаётся в заголовке
+Server-Timing и пишется строкой JSON в лог api.timing с именем
+обработчика, например RecipeViewSet.list, или с именем, заданным
+представлением через rename_view. Запросы, превысившие пороги
+REQUEST_TIMING_BUDGETS, пишутся с уровнем WARNING.
+
+Сериализация замеряется у сериализаторов проекта с TimedSerializerMixin.
+Время сериализации и отрисовки не включает SQL-запросы, выполненные
+внутри них: они учтены во времени базы.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.serializers import ListSerializer
+
+logger = logging.getLogger(__name__)
+
+current_timing = ContextVar("current_timing", default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.action = None
+        self.queries = 0
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql += time.perf_counter() - start
+
+    @contextmanager
+    def capture(self):
+        token = current_timing.set(self)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.execute)
+                    )
+                yield self
+        finally:
+            current_timing.reset(token)
+
+    def begin(self):
+        self.depth += 1
+        return time.perf_counter(), self.sql
+
+    def end(self, name, mark):
+        """Прибавляет к name время с отметки begin() за вычетом SQL."""
+        self.depth -= 1
+        start, sql = mark
+        elapsed = time.perf_counter() - start - (self.sql - sql)
+        setattr(self, name, getattr(self, name) + elapsed)
+
+    @contextmanager
+    def section(self, name):
+        """Замеряет блок в name; вложенные блоки не считаются
+        повторно."""
+        if self.depth:
+            yield
+            return
+        mark = self.begin()
+        try:
+            yield
+        finally:
+            self.end(name, mark)
+
+    def metrics(self):
+        return {
+            "total": (time.perf_counter() - self.started) * 1000,
+            "sql": self.sql * 1000,
+            "queries": self.queries,
+            "serialize": self.serialize * 1000,
+            "render": self.render * 1000,
+        }
+
+
+class TimedSerializerMixin:
+    """Прибавляет время свойства data к serialize у запросов из выборки.
+
+    Списки many=True замеряются, если в Meta сериализатора указан
+    list_serializer_class с этим миксином, например TimedListSerializer.
+    """
+
+    @property
+    def data(self):
+        timing = current_timing.get()
+        if timing is None:
+            return super().data
+        with timing.section("serialize"):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, ListSerializer):
+    pass
+
+
+def view_name(view_func, method):
+    if hasattr(view_func, "view_name"):
+        return view_func.view_name
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return getattr(view_func, "__name__", None)
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f"{view_class.__name__}.{action}"
+
+
+def rename_view(request, name):
+    """Подписывает запрос в замерах и метриках именем name, когда одно
+    действие обслуживает разные по стоимости запросы."""
+    getattr(request, "_request", request).view_name = name
+
+
+def over_budget(action, metrics):
+    budgets = settings.REQUEST_TIMING_BUDGETS
+    limits = {**budgets.get("default", {}), **budgets.get(action, {})}
+    return sorted(
+        name for name, limit in limits.items() if metrics[name] > limit
+    )
+
+
+class RequestTimingMiddleware(MiddlewareMixin):
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        with RequestTiming().capture() as timing:
+            request.timing = timing
+            response = self.get_response(request)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        with RequestTiming().capture() as timing:
+            request.timing = timing
+            response = await self.get_response(request)
+        return self.finish(request, response, timing)
+
+    @staticmethod
+    def sampled():
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        return rate >= 1 or random.random() < rate
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        timing = getattr(request, "timing", None)
+        if timing is None:
+            return response
+        mark = timing.begin()
+        response.add_post_render_callback(
+            lambda rendered: timing.end("render", mark)
+        )
+        return response
+
+    def finish(self, request, response, timing):
+        timing.action = getattr(request, "view_name", None)
+        metrics = timing.metrics()
+        response["Server-Timing"] = ", ".join((
+            f'db;dur={metrics["sql"]:.1f};desc="{metrics["queries"]} SQL"',
+            f'serialize;dur={metrics["serialize"]:.1f}',
+            f'render;dur={metrics["render"]:.1f}',
+            f'total;dur={metrics["total"]:.1f}',
+        ))
+        exceeded = over_budget(timing.action, metrics)
+        level = logging.WARNING if exceeded else logging.INFO
+        if not logger.isEnabledFor(level):
+            return response
+        logger.log(
+            level,
+            json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "action": timing.action,
+                **{
+                    name: round(value, 2)
+                    for name, value in metrics.items()
+                },
+                "over_budget": exceeded,
+            }, ensure_ascii=False),
+        )
+        return response
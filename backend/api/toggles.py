@@ -0,0 +1,88 @@
+"""Изменения избранного, корзины и подписок.
+
+Общие для синхронных вьюсетов и асинхронных представлений из
+api.async_views, чтобы побочные изменения (итоги списка покупок) всегда
+выполнялись в одной транзакции с основной записью.
+"""
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from recipes.counters import change_counter
+from recipes.models import Recipe, ShoppingCart, ShoppingListItem
+from users.models import Follow, User
+from users.serializers import FollowSerializer
+
+
+def lock_user(user):
+    """Блокирует строку пользователя до конца транзакции, чтобы его
+    избранное и корзина менялись по очереди: иначе bulk_create с
+    ignore_conflicts мог бы посчитать добавленной строку, которую
+    вставил параллельный запрос."""
+    list(User.objects.select_for_update().filter(pk=user.pk).values("pk"))
+
+
+@transaction.atomic
+def add_recipe_to(model, user, recipe):
+    lock_user(user)
+    model.objects.create(user=user, recipe=recipe)
+    if model is ShoppingCart:
+        ShoppingListItem.objects.add_recipe(recipe, [user.pk])
+
+
+@transaction.atomic
+def remove_recipe_from(model, user, recipe_id):
+    lock_user(user)
+    rows = model.objects.filter(user=user, recipe__id=recipe_id)
+    deleted, _ = rows.delete()
+    if deleted and model is ShoppingCart:
+        ShoppingListItem.objects.remove_recipe(recipe_id, [user.pk])
+    return deleted
+
+
+@transaction.atomic
+def add_recipes_to(model, user, recipe_ids):
+    """Добавляет рецепты, которых ещё нет у пользователя. Возвращает
+    отсортированные id добавленных рецептов."""
+    lock_user(user)
+    added = sorted(
+        Recipe.objects.filter(id__in=recipe_ids)
+        .exclude(id__in=model.objects.filter(user=user).values("recipe"))
+        .values_list("id", flat=True)
+    )
+    model.objects.bulk_create(
+        (model(user=user, recipe_id=recipe_id) for recipe_id in added),
+        ignore_conflicts=True,
+    )
+    change_counter(model, added, 1)
+    if added and model is ShoppingCart:
+        ShoppingListItem.objects.add_recipes(added, [user.pk])
+    return added
+
+
+@transaction.atomic
+def remove_recipes_from(model, user, recipe_ids):
+    """Убирает рецепты одним запросом и возвращает id убранных."""
+    lock_user(user)
+    rows = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+    removed = sorted(rows.values_list("recipe_id", flat=True))
+    rows.delete()
+    if removed and model is ShoppingCart:
+        ShoppingListItem.objects.remove_recipes(removed, [user.pk])
+    return removed
+
+
+@transaction.atomic
+def subscribe(request, author):
+    """Подписывает request.user на автора и возвращает данные автора
+    для ответа."""
+    serializer = FollowSerializer(
+        author, data=request.data, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    Follow.objects.create(user=request.user, author=author)
+    author.refresh_from_db(fields=("followers_count",))
+    return serializer.data
+
+
+@transaction.atomic
+def unsubscribe(user, author):
+    get_object_or_404(Follow, user=user, author=author).delete()
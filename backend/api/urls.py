@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from users.views import CustomUserViewSet
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+from . import async_views
+from .views import IngredientViewSet, MetricsView, RecipeViewSet, TagViewSet
 
 app_name = "api"
 
@@ -13,11 +16,19 @@ router.register("tags", TagViewSet, basename="tags")
 router.register("recipes", RecipeViewSet, basename="recipes")
 
 main_urls = [
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     path("", include(router.urls)),
     path("", include("djoser.urls")),
     
 
 ]
+if settings.ASYNC_TOGGLES:
+    main_urls = [
+        path("recipes/<int:pk>/favorite/", async_views.favorite),
+        path("recipes/<int:pk>/shopping_cart/", async_views.shopping_cart),
+        path("users/<int:id>/subscribe/", async_views.subscribe_user),
+    ] + main_urls
+
 urlpatterns = [
     path("auth/", include("djoser.urls.authtoken")),
     path("", include(main_urls)),
@@ -1,31 +1,51 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
                             ShoppingCart, Tag)
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+                                        IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from users.models import Follow
 
+from .cache import CachedResponseMixin
+from .cookable_index import cookable_index
+from .feed import user_feed
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .ingredient_index import ingredient_index
+from .metrics import registry
+from .pagination import RecipePagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer,
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .serializers import (CookableRecipeSerializer, FavoriteSerializer,
                           IngredientSerializer, RecipeCreateSerializer,
-                          RecipesSerializer, TagSerializer)
+                          RecipeIdsSerializer, RecipesSerializer,
+                          TagSerializer)
+from .shopping_list import FORMATS as SHOPPING_LIST_FORMATS
+from .shopping_list import shopping_list_response
+from .timing import rename_view
+from .toggles import (add_recipe_to, add_recipes_to, remove_recipe_from,
+                      remove_recipes_from)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Ingredient,)
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientFilter,)
@@ -33,15 +53,46 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
+    cache_query_params = (IngredientFilter.search_param, "limit")
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param)
+        if not name:
+            return super().list(request, *args, **kwargs)
+        rename_view(request, "IngredientViewSet.search")
+        return self.cached_response(self.search, request, name)
+
+    def search(self, request, name):
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if request.query_params.get("limit", "").isdigit():
+            limit = int(request.query_params["limit"])
+            if settings.INGREDIENT_SEARCH_LIMIT is not None:
+                limit = min(limit, settings.INGREDIENT_SEARCH_LIMIT)
+        return Response(ingredient_index.search(name, limit))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateSerializer
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.request.method not in SAFE_METHODS or user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef("pk"))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef("pk"))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef("author"))),
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -52,15 +103,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def __add_to(self, model, user, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        add_recipe_to(model, user, recipe)
         serializer = FavoriteSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def __delete_from(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        obj.delete()
+        remove_recipe_from(model, user, pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def __bulk(self, model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        if request.method == "POST":
+            applied = add_recipes_to(model, request.user, recipe_ids)
+        else:
+            applied = remove_recipes_from(model, request.user, recipe_ids)
+        return Response({
+            "applied": applied,
+            "skipped": sorted(set(recipe_ids).difference(applied)),
+        })
+
     @action(
         methods=["POST", "DELETE"],
         detail=True,
@@ -88,29 +151,118 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.__delete_from(Favorite, user, pk)
 
     @action(
-        methods=["GET"],
+        methods=["POST", "DELETE"],
         detail=False,
+        url_path="shopping_cart",
         permission_classes=[IsAuthenticated]
     )
+    def shopping_cart_bulk(self, request):
+        return self.__bulk(ShoppingCart, request)
+
+    @action(
+        methods=["POST", "DELETE"],
+        detail=False,
+        url_path="favorite",
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self.__bulk(Favorite, request)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, PDFRenderer,
+                          JSONRenderer],
+    )
     def download_shopping_cart(self, request):
         user = request.user
         if user.is_anonymous:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
-        recipes_query = IngredientAmount.objects.filter(
-            recipe__shopping_cart__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        text = (
-            f'Список покупок пользователя: {user}\n'
+        file_format = request.accepted_renderer.format
+        if file_format not in SHOPPING_LIST_FORMATS:
+            file_format = "txt"
+        return shopping_list_response(
+            user, file_format,
+            streaming=not isinstance(request._request, ASGIRequest),
+        )
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок пользователя, сначала новые."""
+        queryset, paginator = user_feed(self.get_queryset(), request.user)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[AllowAny],
+    )
+    def what_can_i_cook(self, request):
+        """Рецепты, для которых больше всего ингредиентов уже есть:
+        ?ingredients=1&ingredients=2 или ?ingredients=1,2."""
+        values = [
+            value.strip()
+            for raw in request.query_params.getlist("ingredients")
+            for value in raw.split(",") if value.strip()
+        ]
+        if not values:
+            raise ValidationError(
+                {"ingredients": "Укажите хотя бы один ингредиент"}
+            )
+        if not all(value.isdigit() for value in values):
+            raise ValidationError(
+                {"ingredients": "Ингредиенты задаются числовыми id"}
+            )
+        ingredient_ids = {int(value) for value in values}
+        limit = settings.COOKABLE_DEFAULT_LIMIT
+        if request.query_params.get("limit", "").isdigit():
+            limit = min(
+                int(request.query_params["limit"]),
+                settings.COOKABLE_MAX_LIMIT,
+            )
+        found = cookable_index.search(ingredient_ids, limit)
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in found]
+        )
+        missing = {}
+        for amount in IngredientAmount.objects.filter(
+            recipe__in=recipes
+        ).exclude(
+            ingredient__in=ingredient_ids
+        ).select_related("ingredient"):
+            missing.setdefault(amount.recipe_id, []).append(amount)
+        serializer = CookableRecipeSerializer(
+            [
+                {
+                    "recipe": recipes[recipe_id],
+                    "matched": matched,
+                    "total": total,
+                    "missing": missing.get(recipe_id, []),
+                }
+                for recipe_id, matched, total in found
+                if recipe_id in recipes
+            ],
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Метрики запросов всех воркеров в формате Prometheus."""
+
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(
+            registry.render(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
         )
-        text += '\n'.join([
-            f'- {ingredient["ingredient__name"]} - {ingredient["amount"]} '
-            f'{ingredient["ingredient__measurement_unit"]}'
-            for ingredient in recipes_query
-        ])
-        filename = 'shopping_list.txt'
-        response = HttpResponse(text, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.timing.RequestTimingMiddleware",
+    "api.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -109,13 +111,92 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Кеши рецептов, ответов, токенов и версии данных сбрасываются при
+# изменениях, поэтому при нескольких воркерах кеш должен быть общим
+# (Redis или Memcached). С кешем в памяти процесса такие записи живут не
+# дольше LOCAL_CACHE_MAX_TIMEOUT секунд; manage.py check --deploy
+# предупреждает об этом.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+LOCAL_CACHE_MAX_TIMEOUT = 5
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+SHOPPING_LIST_CACHE_MAX_SIZE = 1024 * 1024
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    "SHOPPING_LIST_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
+RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60
+RESPONSE_CACHE_MAX_AGE = 60
+RECIPE_CACHE_TIMEOUT = 60 * 60
+TOKEN_CACHE_TIMEOUT = 60 * 60
+TOKEN_CACHE_CHECK_INTERVAL = 5
+TOKEN_CACHE_MAX_SIZE = 10_000
+
+INGREDIENT_SEARCH_LIMIT = None
+INGREDIENT_INDEX_CHECK_INTERVAL = 5
+
+RECIPE_IMAGE_WORKERS = 2
+RECIPE_IMAGE_SYNC = os.getenv("RECIPE_IMAGE_SYNC", "") == "1"
+RECIPE_IMAGE_THUMBNAIL_SIZE = (480, 320)
+RECIPE_IMAGE_QUALITY = 80
+
+RECIPE_BULK_MAX_SIZE = 100
+
+RECIPE_SEARCH_CONFIG = "russian"
+
+COOKABLE_INDEX_CHECK_INTERVAL = 60
+COOKABLE_INDEX_MAX_CHANGES = 1000
+COOKABLE_INDEX_CHANGE_TIMEOUT = 60 * 60
+COOKABLE_DEFAULT_LIMIT = 10
+COOKABLE_MAX_LIMIT = 50
+
+FEED_STRATEGY = os.getenv("FEED_STRATEGY", "read")
+
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.getenv("REQUEST_TIMING_SAMPLE_RATE", "0.01")
+)
+REQUEST_TIMING_BUDGETS = {
+    "default": {"total": 500, "sql": 200, "queries": 30},
+    "IngredientViewSet.search": {"total": 100},
+}
+
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "api.timing": {
+            "handlers": ["console"],
+            "level": os.getenv("REQUEST_TIMING_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
+ASYNC_TOGGLES = os.getenv("ASYNC_TOGGLES", "") == "1"
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 
-from .models import (ShoppingCart, Favorite, Ingredient, IngredientAmount,
-                     Recipe, Tag)
+from .models import (ShoppingCart, Favorite, FeedEntry, Ingredient,
+                     IngredientAmount, Recipe, ShoppingListItem, Tag)
 
 
 class IngredientsInline(admin.TabularInline):
@@ -10,9 +11,48 @@ class IngredientsInline(admin.TabularInline):
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
+    """Добавление и удаление корзин меняет итоги списков покупок так же,
+    как API; менять существующую строку нельзя."""
+
+    list_display = (
+        "user",
+        "recipe",
+    )
+    list_filter = ("user",)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ShoppingListItem.objects.add_recipe(obj.recipe, [obj.user_id])
+
+    def delete_model(self, request, obj):
+        ShoppingListItem.objects.remove_recipe(obj.recipe, [obj.user_id])
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for cart in queryset:
+            self.delete_model(request, cart)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        "user",
+        "ingredient",
+        "amount",
+    )
+    list_filter = ("user",)
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
     list_display = (
         "user",
         "recipe",
+        "pub_date",
     )
     list_filter = ("user",)
 
@@ -62,7 +102,10 @@ class RecipeAdmin(admin.ModelAdmin):
         "pk",
         "name",
         "author",
+        "favorites_count",
+        "shopping_cart_count",
     )
+    readonly_fields = ("favorites_count", "shopping_cart_count")
     list_filter = ("name", "author", "tags")
     search_fields = ("name", "author", "tags")
 
@@ -0,0 +1,46 @@
+"""Денормализованные счётчики популярности рецептов и авторов.
+
+Каждой модели-источнику соответствует один счётчик: строка источника
+увеличивает на единицу поле объекта, на который ссылается её внешний
+ключ. Одиночные строки, в том числе смена внешнего ключа при save(),
+учитываются сигналами из recipes.signals; bulk_create и
+QuerySet.update() обходят сигналы, поэтому такие места вызывают
+change_counter сами.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Follow, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = {
+    Favorite: (Recipe, "recipe", "favorites_count"),
+    ShoppingCart: (Recipe, "recipe", "shopping_cart_count"),
+    Recipe: (User, "author", "recipes_count"),
+    Follow: (User, "author", "followers_count"),
+}
+
+
+def change_counter(source, target_ids, step):
+    """Сдвигает счётчик объектов target_ids на step одним UPDATE с F().
+
+    Счётчик не уходит ниже нуля, даже если успел разойтись с данными.
+    """
+    model, _, field = COUNTERS[source]
+    queryset = model.objects.filter(pk__in=target_ids)
+    if step < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -step})
+    queryset.update(**{field: F(field) + step})
+
+
+def actual_count(source):
+    """Выражение с настоящим значением счётчика для аннотации."""
+    _, foreign_key, _ = COUNTERS[source]
+    rows = (
+        source.objects.filter(**{foreign_key: OuterRef("pk")})
+        .order_by()
+        .values(foreign_key)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
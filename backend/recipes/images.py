@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TO = Recipe._meta.get_field("image").upload_to
+VARIANTS_DIR = os.path.join(UPLOAD_TO, "variants")
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix="recipe-images",
+        )
+    return _executor
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def uploaded_hash(file):
+    """Хеш загрузки, который HashedBase64ImageField кладёт в имя файла."""
+    return os.path.splitext(os.path.basename(file.name))[0]
+
+
+def store_image(file):
+    """Сохраняет загруженную картинку под именем из хеша содержимого.
+
+    Одинаковые загрузки попадают в один файл, который повторно не
+    записывается. Возвращает имя в хранилище. Декодирование base64 и эта
+    запись остаются в запросе: оригинал нужен для поля image в ответе и
+    как источник для build_variants, а в пул уходят только варианты.
+    """
+    name = os.path.join(UPLOAD_TO, os.path.basename(file.name))
+    if not default_storage.exists(name):
+        name = default_storage.save(name, file)
+    return name
+
+
+def schedule_variants(recipe):
+    """После коммита передаёт построение вариантов картинки в пул
+    потоков."""
+    args = recipe.pk, recipe.image.name, recipe.image_hash
+    if settings.RECIPE_IMAGE_SYNC:
+        transaction.on_commit(lambda: build_variants(*args))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(build_variants, *args)
+        )
+
+
+def variant_names(image_hash):
+    """Имена вариантов в хранилище. Они зависят только от хеша и
+    настроек, поэтому известны до того, как варианты построены."""
+    width, height = settings.RECIPE_IMAGE_THUMBNAIL_SIZE
+    base = os.path.join(VARIANTS_DIR, image_hash)
+    return {
+        "webp": f"{base}.webp",
+        "thumbnail": f"{base}_{width}x{height}.jpg",
+        "thumbnail_webp": f"{base}_{width}x{height}.webp",
+    }
+
+
+def save_variant(name, image, image_format, **options):
+    if default_storage.exists(name):
+        return name
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(recipe_id, image_name, image_hash):
+    """Строит WebP-копию и миниатюры фиксированного размера в JPEG и
+    WebP и записывает их имена в Recipe.image_variants."""
+    try:
+        with default_storage.open(image_name) as file:
+            image = Image.open(file)
+            image.load()
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        thumbnail = ImageOps.fit(
+            image, settings.RECIPE_IMAGE_THUMBNAIL_SIZE, Image.LANCZOS
+        )
+        names = variant_names(image_hash)
+        quality = settings.RECIPE_IMAGE_QUALITY
+        variants = {
+            "webp": save_variant(
+                names["webp"], image, "WEBP", quality=quality
+            ),
+            "thumbnail": save_variant(
+                names["thumbnail"], thumbnail, "JPEG",
+                quality=quality, optimize=True, progressive=True,
+            ),
+            "thumbnail_webp": save_variant(
+                names["thumbnail_webp"], thumbnail, "WEBP", quality=quality,
+            ),
+        }
+        recipe = Recipe.objects.filter(
+            pk=recipe_id, image_hash=image_hash
+        ).first()
+        if recipe is not None:
+            recipe.image_variants = variants
+            recipe.save(update_fields=("image_variants",))
+    except Exception:
+        logger.exception("Не удалось обработать картинку %s", image_name)
+    finally:
+        if not settings.RECIPE_IMAGE_SYNC:
+            connection.close()
@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants, content_hash
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Строит миниатюры и WebP-варианты картинок рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Перестроить варианты и у рецептов, где они уже есть",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="").only(
+            "pk", "image", "image_hash", "image_variants"
+        ).order_by("pk")
+        if not options["force"]:
+            recipes = recipes.filter(image_variants={})
+        built = skipped = 0
+        for recipe in recipes.iterator(chunk_size=200):
+            if not recipe.image_hash:
+                try:
+                    with default_storage.open(recipe.image.name) as file:
+                        recipe.image_hash = content_hash(file.read())
+                except OSError as error:
+                    self.stderr.write(
+                        f"Рецепт {recipe.pk}: не удалось прочитать "
+                        f"{recipe.image.name}: {error}"
+                    )
+                    skipped += 1
+                    continue
+                recipe.save(update_fields=("image_hash",))
+            build_variants(recipe.pk, recipe.image.name, recipe.image_hash)
+            built += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано картинок: {built}, пропущено: {skipped}"
+            )
+        )
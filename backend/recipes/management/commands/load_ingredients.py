@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.signals import ingredients_loaded
+
+READ_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    """Читает массив объектов по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = file.read(READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise CommandError("Ожидается JSON-массив ингредиентов")
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    raise CommandError("Файл с ингредиентами обрывается")
+                buffer += chunk
+                continue
+            yield item["name"], item["measurement_unit"]
+            buffer = buffer[end:]
+
+
+READERS = {".csv": read_csv, ".json": read_json}
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Загружает справочник ингредиентов из CSV или JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=settings.BASE_DIR / "data" / "ingredients.csv",
+            type=Path,
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Не использовать COPY даже на PostgreSQL",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError("Поддерживаются только файлы .csv и .json")
+        if not path.exists():
+            raise CommandError(f"Файл {path} не найден")
+        rows = (
+            (name.strip(), measurement_unit.strip())
+            for name, measurement_unit in reader(path)
+            if name.strip()
+        )
+        use_copy = (
+            connection.vendor == "postgresql" and not options["no_copy"]
+        )
+        load = self.copy if use_copy else self.bulk_create
+        total = 0
+        before = Ingredient.objects.count()
+        with transaction.atomic():
+            for chunk in chunks(rows, options["batch_size"]):
+                total += len(chunk)
+                load(chunk)
+        inserted = Ingredient.objects.count() - before
+        if inserted:
+            ingredients_loaded.send(sender=Ingredient, count=inserted)
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено ингредиентов: {inserted}, "
+            f"пропущено: {total - inserted}"
+        ))
+
+    @staticmethod
+    def bulk_create(chunk):
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in chunk
+            ),
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def copy(chunk):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS ingredient_load "
+                "(name varchar(100), measurement_unit varchar(20)) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_load (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT DISTINCT name, measurement_unit FROM ingredient_load "
+                "ON CONFLICT (measurement_unit, name) DO NOTHING"
+            )
+            cursor.execute("TRUNCATE ingredient_load")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from users.models import Follow
+
+from recipes.models import FeedEntry, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет ленты подписок FeedEntry заново по подпискам и "
+        "рецептам; нужна после включения FEED_STRATEGY=write"
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        FeedEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FeedEntry._meta.db_table} "
+                "(user_id, author_id, recipe_id, pub_date) "
+                "SELECT follow.user_id, recipe.author_id, recipe.id, "
+                "recipe.pub_date "
+                f"FROM {Recipe._meta.db_table} recipe "
+                f"JOIN {Follow._meta.db_table} follow "
+                "ON follow.author_id = recipe.author_id"
+            )
+            created = cursor.rowcount
+        self.stdout.write(
+            self.style.SUCCESS(f"Записей в лентах подписок: {created}")
+        )
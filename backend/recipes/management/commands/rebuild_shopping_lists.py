@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem, shopping_list_totals
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает или проверяет итоги списков покупок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Только сравнить сохранённые итоги с корзинами",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            self.verify()
+        else:
+            self.rebuild(options["batch_size"])
+
+    @staticmethod
+    def expected():
+        for row in shopping_list_totals().iterator():
+            yield (
+                row["recipe__shopping_cart__user"],
+                row["ingredient"],
+            ), row["total"]
+
+    @transaction.atomic
+    def rebuild(self, batch_size):
+        ShoppingListItem.objects.all().delete()
+        batch, created = [], 0
+        for (user_id, ingredient_id), total in self.expected():
+            batch.append(ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total
+            ))
+            if len(batch) >= batch_size:
+                created += len(ShoppingListItem.objects.bulk_create(batch))
+                batch = []
+        created += len(ShoppingListItem.objects.bulk_create(batch))
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано строк списков покупок: {created}")
+        )
+
+    def verify(self):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in ShoppingListItem.objects
+            .values_list("user_id", "ingredient_id", "amount").iterator()
+        }
+        broken_users = set()
+        for key, total in self.expected():
+            if stored.pop(key, None) != total:
+                broken_users.add(key[0])
+        broken_users.update(user_id for user_id, _ in stored)
+        if broken_users:
+            raise CommandError(
+                "Итоги расходятся у пользователей: "
+                + ", ".join(map(str, sorted(broken_users)))
+            )
+        self.stdout.write(self.style.SUCCESS("Итоги списков покупок верны"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import COUNTERS, actual_count
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики популярности рецептов и авторов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for source, (model, _, field) in COUNTERS.items():
+            fixed = self.recount(
+                model, field, actual_count(source), options["batch_size"]
+            )
+            self.stdout.write(
+                f"{model._meta.label}.{field}: исправлено {fixed}"
+            )
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
+
+    @staticmethod
+    def recount(model, field, actual, batch_size):
+        """Проходит таблицу кусками по первичному ключу, каждый в своей
+        транзакции, и записывает только разошедшиеся значения."""
+        fixed, last_pk = 0, 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    model.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .select_for_update()
+                    .annotate(actual=actual)
+                    .values_list("pk", field, "actual")[:batch_size]
+                )
+                if not rows:
+                    return fixed
+                drifted = [
+                    model(pk=pk, **{field: value})
+                    for pk, stored, value in rows
+                    if stored != value
+                ]
+                model.objects.bulk_update(drifted, (field,))
+                fixed += len(drifted)
+            last_pk = rows[-1][0]
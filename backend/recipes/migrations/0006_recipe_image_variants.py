@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0005_recipe_pub_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_hash",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=64, verbose_name="Хеш картинки"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="Варианты картинки"
+            ),
+        ),
+    ]
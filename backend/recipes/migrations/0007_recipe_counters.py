@@ -0,0 +1,57 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:32
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count(model, foreign_key):
+    rows = (
+        model.objects.filter(**{foreign_key: models.OuterRef("pk")})
+        .order_by()
+        .values(foreign_key)
+        .annotate(total=models.Count("pk"))
+        .values("total")
+    )
+    return Coalesce(models.Subquery(rows), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    ShoppingCart = apps.get_model("recipes", "ShoppingCart")
+    User = apps.get_model("users", "User")
+    Follow = apps.get_model("users", "Follow")
+    Recipe.objects.update(
+        favorites_count=count(Favorite, "recipe"),
+        shopping_cart_count=count(ShoppingCart, "recipe"),
+    )
+    User.objects.update(
+        recipes_count=count(Recipe, "author"),
+        followers_count=count(Follow, "author"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0006_recipe_image_variants"),
+        ("users", "0002_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В избранном"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="shopping_cart_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В корзинах"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
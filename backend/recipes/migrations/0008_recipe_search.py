@@ -0,0 +1,59 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector",
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector(%(config)s::regconfig, coalesce(name, '')), 'A')"
+    " || "
+    "setweight(to_tsvector(%(config)s::regconfig, coalesce(text, '')), 'B')",
+    "CREATE INDEX recipe_search_vector_idx ON recipes_recipe "
+    "USING gin (search_vector)",
+)
+
+POSTGRES_BACKWARD = (
+    "ALTER TABLE recipes_recipe DROP COLUMN search_vector",
+)
+
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    "name, text, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO recipes_recipe_fts (rowid, name, text) "
+    "SELECT id, name, text FROM recipes_recipe",
+)
+
+SQLITE_BACKWARD = ("DROP TABLE recipes_recipe_fts",)
+
+
+def run_for_vendor(postgres_statements, sqlite_statements):
+    """Поисковые структуры зависят от СУБД, поэтому создаются SQL-ом
+    для каждой из них отдельно."""
+
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements, params = (), None
+        if vendor == "postgresql":
+            statements = postgres_statements
+            params = {"config": settings.RECIPE_SEARCH_CONFIG}
+        elif vendor == "sqlite":
+            statements = sqlite_statements
+        for sql in statements:
+            schema_editor.execute(sql, params)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_recipe_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0009_feed"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="tag",
+            name="unique_slug",
+        ),
+        migrations.AlterField(
+            model_name="tag",
+            name="color",
+            field=models.CharField(
+                default="#ffffff",
+                max_length=7,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        message="Неправильный формат HEX Color",
+                        regex="^#(?:[0-9a-fA-F]{3}){1,2}$",
+                    )
+                ],
+                verbose_name="HEX-код",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tag",
+            name="name",
+            field=models.CharField(
+                max_length=20,
+                unique=True,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        message="Допускаются только буквы и цифры", regex="^[\\w]+\\Z"
+                    )
+                ],
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="tag",
+            constraint=models.UniqueConstraint(
+                fields=("slug",), name="Такой тэг уже добавлен"
+            ),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-from users.models import User
+from users.models import Follow, User
 from django.core.validators import MinValueValidator, RegexValidator
 
 
@@ -111,6 +111,12 @@ class Recipe(models.Model):
     name = models.CharField(max_length=200, verbose_name="Название рецепта")
     image = models.ImageField(upload_to="recipes/",
                               verbose_name="Картинка рецепта")
+    image_hash = models.CharField(
+        "Хеш картинки", max_length=64, blank=True, db_index=True
+    )
+    image_variants = models.JSONField(
+        "Варианты картинки", default=dict, blank=True
+    )
     text = models.TextField(verbose_name="Описание рецепта")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -122,11 +128,26 @@ class Recipe(models.Model):
                                   verbose_name="Тэг")
     cooking_time = models.PositiveSmallIntegerField("Время приготовления")
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        "В избранном", default=0, editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        "В корзинах", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -188,3 +209,211 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"Корзина пользователя {self.user}: {self.recipe}"
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    def apply_delta(self, user_ids, delta):
+        """Прибавляет к итогам пользователей изменения количеств
+        ингредиентов вида {ingredient_id: amount}."""
+        delta = {
+            ingredient_id: amount
+            for ingredient_id, amount in delta.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not user_ids or not delta:
+            return
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=delta
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, amount in delta.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if amount > 0:
+                        to_create.append(self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=amount,
+                        ))
+                    continue
+                item.amount += amount
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ("amount",))
+        self.filter(pk__in=to_delete).delete()
+
+    def add_recipe(self, recipe, user_ids):
+        self.add_recipes([recipe], user_ids)
+
+    def remove_recipe(self, recipe, user_ids):
+        self.remove_recipes([recipe], user_ids)
+
+    def add_recipes(self, recipes, user_ids):
+        self.apply_delta(user_ids, recipe_amounts(*recipes))
+
+    def remove_recipes(self, recipes, user_ids):
+        self.apply_delta(user_ids, {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipe_amounts(*recipes).items()
+        })
+
+
+def recipe_amounts(*recipes):
+    """Количества ингредиентов рецептов, сложенные по ингредиентам."""
+    return dict(
+        IngredientAmount.objects.filter(recipe__in=recipes)
+        .values("ingredient_id")
+        .annotate(total=models.Sum("amount"))
+        .order_by()
+        .values_list("ingredient_id", "total")
+    )
+
+
+def shopping_list_totals():
+    """Итоги списков покупок, посчитанные по корзинам заново."""
+    return (
+        IngredientAmount.objects
+        .filter(recipe__shopping_cart__isnull=False)
+        .values("recipe__shopping_cart__user", "ingredient")
+        .annotate(total=models.Sum("amount"))
+        .order_by("recipe__shopping_cart__user", "ingredient")
+    )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField("Количество")
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="Ингредиент уже в списке покупок",
+            )
+        ]
+        ordering = ("user", "ingredient")
+        verbose_name = "Ингредиент в списке покупок"
+        verbose_name_plural = "Списки покупок"
+
+    def __str__(self):
+        return f"Список покупок пользователя {self.user}: {self.ingredient}"
+
+
+class FeedQuerySet(models.QuerySet):
+    def fan_out(self, recipe, batch_size=5000):
+        """Добавляет рецепт в ленты всех подписчиков его автора."""
+        followers = Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list("user_id", flat=True)
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    author_id=recipe.author_id,
+                    recipe_id=recipe.pk,
+                    pub_date=recipe.pub_date,
+                )
+                for user_id in followers.iterator(chunk_size=batch_size)
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+    def backfill(self, user_id, author_id, batch_size=5000):
+        """Добавляет в ленту подписчика уже опубликованные рецепты
+        автора."""
+        recipes = Recipe.objects.filter(
+            author_id=author_id
+        ).values_list("id", "pub_date").order_by()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in recipes.iterator(
+                    chunk_size=batch_size
+                )
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+    def prune(self, user_id, author_id):
+        """Убирает из ленты подписчика рецепты автора."""
+        return self.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика его автора.
+
+    Автор и дата публикации повторяют поля рецепта: по ним без JOIN
+    удаляются записи при отписке и сортируется лента.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed",
+        verbose_name="Подписчик",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Рецепт",
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    objects = FeedQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="Рецепт уже в ленте",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="feed_user_pub_date_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="feed_user_author_idx"
+            ),
+        ]
+        ordering = ("user", "-pub_date", "-recipe")
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Ленты подписок"
+
+    def __str__(self):
+        return f"Лента пользователя {self.user}: {self.recipe}"
@@ -0,0 +1,100 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+На PostgreSQL поиск идёт по столбцу recipes_recipe.search_vector типа
+tsvector с GIN-индексом, на SQLite — по виртуальной таблице FTS5
+recipes_recipe_fts. Обе структуры создаёт миграция 0008 вне схемы ORM,
+а содержимое обновляет index_recipes из сигналов сохранения рецепта;
+после bulk_create его нужно вызвать явно. Совпадение в названии весит
+больше совпадения в описании.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+TABLE = Recipe._meta.db_table
+FTS_TABLE = f"{TABLE}_fts"
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector(%s::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, coalesce(text, '')), 'B')"
+)
+
+
+def ids_condition(column, recipe_ids):
+    if recipe_ids is None:
+        return "", []
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    return f" WHERE {column} IN ({placeholders})", list(recipe_ids)
+
+
+def index_recipes(recipe_ids=None):
+    """Пересчитывает поисковые данные рецептов, а без recipe_ids —
+    всех рецептов."""
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    config = settings.RECIPE_SEARCH_CONFIG
+    where, params = ids_condition("id", recipe_ids)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"UPDATE {TABLE} SET search_vector = {POSTGRES_VECTOR}{where}",
+                [config, config, *params],
+            )
+        elif connection.vendor == "sqlite":
+            fts_where, _ = ids_condition("rowid", recipe_ids)
+            cursor.execute(f"DELETE FROM {FTS_TABLE}{fts_where}", params)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, text) "
+                f"SELECT id, name, text FROM {TABLE}{where}",
+                params,
+            )
+
+
+def unindex_recipe(recipe_id):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [recipe_id]
+            )
+
+
+def fts_query(value):
+    """Запрос FTS5 из слов строки: каждое слово в кавычках и с поиском
+    по началу, чтобы пользовательский ввод не разбирался как синтаксис
+    FTS5."""
+    words = re.findall(r"\w+", value)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, value):
+    """Оставляет рецепты, подходящие под запрос, и добавляет к ним
+    релевантность search_rank (чем больше, тем лучше)."""
+    if connection.vendor == "postgresql":
+        query = "websearch_to_tsquery(%s::regconfig, %s)"
+        params = (settings.RECIPE_SEARCH_CONFIG, value)
+        return queryset.filter(RawSQL(
+            f"{TABLE}.search_vector @@ {query}", params,
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f"ts_rank({TABLE}.search_vector, {query})", params,
+            output_field=FloatField(),
+        ))
+    match = fts_query(value)
+    if not match:
+        return queryset.none().annotate(search_rank=Value(0.0))
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+        (match,),
+    )).annotate(search_rank=RawSQL(
+        f"SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = {TABLE}.id",
+        (match,),
+        output_field=FloatField(),
+    ))
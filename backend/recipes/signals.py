@@ -0,0 +1,168 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+from users.models import Follow
+
+from .counters import COUNTERS, change_counter
+from .models import (FeedEntry, IngredientAmount, Recipe, ShoppingCart,
+                     ShoppingListItem)
+from .search import index_recipes, unindex_recipe
+
+# Отправляется после массовой загрузки ингредиентов в обход save(),
+# например командой load_ingredients; аргумент count — число новых.
+ingredients_loaded = Signal()
+
+# Установлен, пока вызывающий код сам учитывает изменения IngredientAmount
+# в списках покупок, см. shopping_lists_updated_by_caller.
+caller_updates_shopping_lists = ContextVar(
+    "caller_updates_shopping_lists", default=False
+)
+
+
+@contextmanager
+def shopping_lists_updated_by_caller():
+    """Внутри блока сигналы IngredientAmount не меняют списки покупок:
+    вызывающий код прибавляет общую разницу одним apply_delta, а не
+    строкой за строкой."""
+    token = caller_updates_shopping_lists.set(True)
+    try:
+        yield
+    finally:
+        caller_updates_shopping_lists.reset(token)
+
+
+def connect_counter(source):
+    """Подключает сигналы счётчика source: создание и удаление строки
+    сдвигают счётчик, а смена внешнего ключа при сохранении (например,
+    автора рецепта в админке) переносит единицу со старого объекта на
+    новый."""
+    _, foreign_key, field = COUNTERS[source]
+    attname = f"{foreign_key}_id"
+    saved_attname = f"_saved_{field}_target"
+
+    def remember_target(instance, raw=False, update_fields=None, **kwargs):
+        setattr(instance, saved_attname, None)
+        if raw or instance.pk is None:
+            return
+        if update_fields is not None and not (
+            {foreign_key, attname} & set(update_fields)
+        ):
+            return
+        setattr(instance, saved_attname, source.objects.filter(
+            pk=instance.pk
+        ).values_list(attname, flat=True).first())
+
+    def count_created(instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        target = getattr(instance, attname)
+        if created:
+            change_counter(source, [target], 1)
+            return
+        saved = getattr(instance, saved_attname, None)
+        if saved is not None and saved != target:
+            change_counter(source, [saved], -1)
+            change_counter(source, [target], 1)
+
+    def count_deleted(instance, **kwargs):
+        change_counter(source, [getattr(instance, attname)], -1)
+
+    pre_save.connect(
+        remember_target, sender=source, weak=False,
+        dispatch_uid=f"remember_target_{field}",
+    )
+    post_save.connect(
+        count_created, sender=source, weak=False,
+        dispatch_uid=f"count_created_{field}",
+    )
+    post_delete.connect(
+        count_deleted, sender=source, weak=False,
+        dispatch_uid=f"count_deleted_{field}",
+    )
+
+
+for source in COUNTERS:
+    connect_counter(source)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, update_fields, **kwargs):
+    if update_fields and not {"name", "text"} & set(update_fields):
+        return
+    index_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(instance, **kwargs):
+    unindex_recipe(instance.pk)
+
+
+def fan_out_on_write():
+    return settings.FEED_STRATEGY == "write"
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(instance, created, raw=False, **kwargs):
+    if created and not raw and fan_out_on_write():
+        FeedEntry.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, raw=False, **kwargs):
+    if created and not raw and fan_out_on_write():
+        FeedEntry.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(instance, **kwargs):
+    if fan_out_on_write():
+        FeedEntry.objects.prune(instance.user_id, instance.author_id)
+
+
+def apply_to_carts(recipe_id, delta):
+    """Прибавляет изменение количеств ингредиентов рецепта к спискам
+    покупок пользователей, у которых он в корзине."""
+    with transaction.atomic():
+        ShoppingListItem.objects.apply_delta(
+            ShoppingCart.objects.filter(recipe_id=recipe_id)
+            .values_list("user_id", flat=True),
+            delta,
+        )
+
+
+@receiver(pre_save, sender=IngredientAmount)
+def remember_saved_amount(instance, raw=False, **kwargs):
+    instance._saved_amount = None
+    if instance.pk is not None and not raw:
+        instance._saved_amount = (
+            IngredientAmount.objects.filter(pk=instance.pk)
+            .values_list("ingredient_id", "amount").first()
+        )
+
+
+@receiver(post_save, sender=IngredientAmount)
+def add_amount_to_shopping_lists(instance, raw=False, **kwargs):
+    if raw or caller_updates_shopping_lists.get():
+        return
+    delta = {instance.ingredient_id: instance.amount}
+    saved = getattr(instance, "_saved_amount", None)
+    if saved is not None:
+        ingredient_id, amount = saved
+        delta[ingredient_id] = delta.get(ingredient_id, 0) - amount
+    apply_to_carts(instance.recipe_id, delta)
+
+
+@receiver(pre_delete, sender=IngredientAmount)
+def remove_amount_from_shopping_lists(instance, **kwargs):
+    """Срабатывает и при каскадном удалении рецепта: до удаления строк
+    корзины ещё на месте, и из списков вычитается весь рецепт."""
+    if caller_updates_shopping_lists.get():
+        return
+    apply_to_carts(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
@@ -11,7 +11,10 @@ class UserAdmin(admin.ModelAdmin):
         "first_name",
         "last_name",
         "email",
+        "recipes_count",
+        "followers_count",
     )
+    readonly_fields = ("recipes_count", "followers_count")
     list_filter = (
         "email",
         "username",
@@ -11,6 +11,12 @@ class User(AbstractUser):
     first_name = models.CharField("Имя", max_length=150, blank=True)
     last_name = models.CharField("Фамилия", max_length=150, blank=True)
     email = models.EmailField("Электронная почта", max_length=254, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        "Рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        "Подписчиков", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Пользователь"
@@ -1,3 +1,4 @@
+from api.timing import TimedListSerializer, TimedSerializerMixin
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
@@ -6,7 +7,7 @@ from rest_framework.exceptions import ValidationError
 from .models import User
 
 
-class RegistrationSerializer(UserCreateSerializer):
+class RegistrationSerializer(TimedSerializerMixin, UserCreateSerializer):
     email = serializers.EmailField()
 
     class Meta:
@@ -21,7 +22,7 @@ class RegistrationSerializer(UserCreateSerializer):
         )
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField("get_is_subscribed")
 
     class Meta:
@@ -34,17 +35,19 @@ class CustomUserSerializer(UserSerializer):
             "last_name",
             "is_subscribed",
         )
+        list_serializer_class = TimedListSerializer
 
     def get_is_subscribed(self, obj):
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         return obj.following.filter(user=request.user).exists()
 
 
 class FollowSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField("get_recipes_count")
 
     def validate(self, data):
         author_id = self.context.get("request").parser_context.get(
@@ -63,20 +66,30 @@ class FollowSerializer(CustomUserSerializer):
             )
         return data
 
+    @staticmethod
+    def get_recipes_limit(request):
+        limit = request.query_params.get("recipes_limit")
+        if not limit:
+            return None
+        if not limit.isdigit():
+            raise ValidationError(
+                {"recipes_limit": "Укажите целое неотрицательное число"}
+            )
+        return int(limit)
+
     def get_recipes(self, obj):
         from api.serializers import FavoriteSerializer
 
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[: int(limit)]
+        if hasattr(obj, "limited_recipes"):
+            recipes = obj.limited_recipes
+        else:
+            limit = self.get_recipes_limit(self.context.get("request"))
+            recipes = obj.recipes.all()
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = FavoriteSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     class Meta:
         model = User
         fields = (
@@ -88,5 +101,7 @@ class FollowSerializer(CustomUserSerializer):
             "is_subscribed",
             "recipes",
             "recipes_count",
+            "followers_count",
         )
+        list_serializer_class = TimedListSerializer
         read_only_fields = ("email", "username", "first_name", "last_name")
\ No newline at end of file
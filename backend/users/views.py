@@ -1,3 +1,6 @@
+from django.db.models import F, Prefetch, Value, prefetch_related_objects
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -5,9 +8,11 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Follow, User
+from .models import User
 from .serializers import CustomUserSerializer, FollowSerializer
 from api.pagination import CustomPagination
+from api.toggles import subscribe, unsubscribe
+from recipes.models import Recipe
 
 
 class CustomUserViewSet(UserViewSet):
@@ -23,15 +28,11 @@ class CustomUserViewSet(UserViewSet):
         author = get_object_or_404(User, pk=id)
         follower = request.user
         if request.method == "POST":
-            serializer = FollowSerializer(
-                author, data=request.data, context={"request": request}
-            )
-            serializer.is_valid(raise_exception=True)
-            Follow.objects.create(user=follower, author=author)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            data = subscribe(request, author)
+            return Response(data, status=status.HTTP_201_CREATED)
 
         if request.method == "DELETE":
-            get_object_or_404(Follow, user=follower, author=author).delete()
+            unsubscribe(follower, author)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -40,8 +41,36 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         follower = request.user
-        queryset = User.objects.filter(following__user=follower)
+        limit = FollowSerializer.get_recipes_limit(request)
+        queryset = User.objects.filter(following__user=follower).annotate(
+            is_subscribed=Value(True),
+        ).order_by("id")
         pages = self.paginate_queryset(queryset)
+        prefetch_related_objects(pages, Prefetch(
+            "recipes",
+            queryset=self.limited_recipes(pages, limit),
+            to_attr="limited_recipes",
+        ))
         serializer = FollowSerializer(pages, many=True,
                                       context={"request": request})
         return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def limited_recipes(authors, limit):
+        """Не более limit последних рецептов каждого автора одним
+        запросом с ROW_NUMBER() OVER (PARTITION BY author)."""
+        recipes = Recipe.objects.all()
+        if limit is None:
+            return recipes
+        ranked = Recipe.objects.filter(author__in=authors).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F("author"),
+                order_by=Recipe._meta.ordering,
+            )
+        ).order_by().values("id", "row_number")
+        sql, params = ranked.query.sql_with_params()
+        return recipes.filter(id__in=RawSQL(
+            f"SELECT id FROM ({sql}) ranked WHERE row_number <= %s",
+            (*params, limit),
+        ))